@@ -0,0 +1,21 @@
+# prompts/corrective_prompts_v1.py
+# Follow-up turn for a BAYT_PROMPT reply whose affect failed validation.
+# Sent after the rejected reply (as the assistant turn), so the model sees
+# what it returned, which labels were rejected, and the allowed list.
+
+AFFECT_CORRECTION_PROMPT = """\
+پاسخ قبلی معتبر نیست.
+
+برچسب‌های affect نامعتبر:
+{rejected}
+
+affect باید حداکثر دو مورد باشد و فقط از این فهرست:
+{affect_list}
+اگر هیچ‌کدام مناسب نیست، لیست خالی برگردان.
+
+همان bayt_hint را نگه دار و خروجی را دقیقاً با همان قالب JSON و بدون متن اضافی برگردان:
+{{
+  "bayt_hint": "",
+  "affect": []
+}}
+"""
@@ -0,0 +1,46 @@
+# prompts/packed_prompts_v1.py
+# Packed variant of BAYT_PROMPT (prompts_v1.py): several bayts of one
+# ghazal per request, sharing the ghazal_axis context.
+# Same instructions and per-bayt output schema, wrapped in {"bayts": [...]}
+# so it also works in JSON mode; records keep
+# PROMPT_VERSION from prompts_v1 as their provenance.
+
+PACKED_BAYT_PROMPT = """\
+در زیر چند بیت از یک غزل حافظ، هر کدام با شرح نثری آن، آمده است.
+
+وظیفه: برای هر بیت، جداگانه، استخراج دو برچسب معنایی
+
+1) bayt_hint
+- عبارت اسمی کوتاه
+- توصیف آنچه در همان بیت رخ می‌دهد
+- بدون فعل
+- بدون توضیح یا بازنویسی
+- خنثی و توصیفی
+
+2) affect
+- حداکثر دو مورد
+- فقط از این فهرست:
+{affect_list}
+- اگر احساس مستقیمی وجود ندارد، لیست خالی
+
+محور معنایی غزل (فقط برای زمینه):
+{ghazal_axis}
+
+ابیات:
+{bayts}
+
+خروجی را دقیقاً با این قالب JSON، با یک شیء برای هر بیت و به همان ترتیب، و بدون متن اضافی برگردان:
+{{
+  "bayts": [
+    {{"bayt_id": 0, "bayt_hint": "", "affect": []}}
+  ]
+}}
+"""
+
+PACKED_BAYT_ITEM = """\
+[bayt_id={bayt_id}]
+بیت:
+{bayt_text}
+شرح بیت:
+{bayt_prose}
+"""
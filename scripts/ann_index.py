@@ -0,0 +1,292 @@
+# scripts/ann_index.py
+# IVF (inverted file) approximate nearest-neighbour index over bayt embeddings
+#
+# Build once, load fast:
+#   python -m scripts.ann_index --nlist 64 --nprobe 1 2 4 8 16
+# writes next to data/embeddings/bayts_embeddings.npy:
+#   bayts_embeddings.ivf.npz           centroids, bucket offsets, row ids,
+#                                      stamps of the source and vectors files
+#   bayts_embeddings.ivf.vectors.npy   unit rows in bucket order (memory-mapped)
+# and prints recall@k against exact search for every nprobe, so an
+# operating point can be picked. Loading checks the index against the
+# embeddings file it was built from.
+
+import argparse
+import json
+import time
+import numpy as np
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from scripts.corpus_snapshot import source_stamp
+from scripts.embedding_store import normalize_rows
+from scripts.retrieval import EMBEDDINGS_PATH, top_k_indices
+
+KMEANS_ITERS = 20
+ASSIGN_BLOCK = 8192
+
+
+def index_path(source: Path = EMBEDDINGS_PATH) -> Path:
+    """bayts_embeddings.npy -> bayts_embeddings.ivf.npz"""
+    return source.with_name(f"{source.stem}.ivf.npz")
+
+
+def vectors_path(path: Path) -> Path:
+    """bayts_embeddings.ivf.npz -> bayts_embeddings.ivf.vectors.npy"""
+    return path.with_name(f"{path.stem}.vectors.npy")
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (by cosine) for every row, computed in blocks."""
+    out = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], ASSIGN_BLOCK):
+        block = vectors[start:start + ASSIGN_BLOCK]
+        out[start:start + ASSIGN_BLOCK] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    nlist: int,
+    *,
+    iters: int = KMEANS_ITERS,
+    seed: int = 42,
+) -> np.ndarray:
+    """
+    K-means on unit vectors with cosine assignment.
+    Empty clusters are re-seeded from random rows.
+    """
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    centroids = vectors[rng.choice(n, size=nlist, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=nlist)
+
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(n, size=int(empty.sum()), replace=False)]
+
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index: rows are bucketed by nearest centroid and stored
+    contiguously per bucket. A query scans only the `nprobe` closest buckets.
+    A loaded index keeps `vectors` memory-mapped.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        offsets: np.ndarray,
+        row_ids: np.ndarray,
+        vectors: np.ndarray,
+        nprobe: int = 8,
+    ):
+        self.centroids = centroids   # (nlist, d) unit rows
+        self.offsets = offsets       # (nlist + 1,) bucket boundaries
+        self.row_ids = row_ids       # (n,) original row position per slot
+        self.vectors = vectors       # (n, d) unit rows, bucket-ordered
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    def __len__(self) -> int:
+        return self.row_ids.shape[0]
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        nlist: Optional[int] = None,
+        *,
+        nprobe: int = 8,
+        seed: int = 42,
+    ) -> "IVFIndex":
+        """Cluster the (normalized) embeddings and lay rows out per bucket."""
+        vectors = normalize_rows(embeddings)
+        if nlist is None:
+            nlist = max(1, int(np.sqrt(vectors.shape[0])))
+        nlist = min(nlist, vectors.shape[0])
+
+        centroids = spherical_kmeans(vectors, nlist, seed=seed)
+        assign = _assign(vectors, centroids)
+
+        row_ids = np.argsort(assign, kind="stable").astype(np.int32)
+        counts = np.bincount(assign, minlength=nlist)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        return cls(centroids, offsets, row_ids, vectors[row_ids], nprobe=nprobe)
+
+    def save(self, path: Path, source: Path):
+        """
+        Write the index built from the embeddings file `source`.
+        The vectors go first; the .npz records both files' stamps, so a
+        crash in between leaves an index that `load` rejects.
+        """
+        vectors = vectors_path(path)
+        np.save(vectors, self.vectors)
+        np.savez(
+            path,
+            centroids=self.centroids,
+            offsets=self.offsets,
+            row_ids=self.row_ids,
+            nprobe=np.int64(self.nprobe),
+            stamps=np.array(json.dumps({
+                "source": source_stamp(source),
+                "vectors": source_stamp(vectors),
+            })),
+        )
+
+    @classmethod
+    def load(cls, path: Path, source: Path) -> "IVFIndex":
+        """
+        Open the index at `path`, checking that it was built from the
+        current `source` embeddings file. Raises ValueError when stale.
+        """
+        vectors = vectors_path(path)
+        if not path.exists() or not vectors.exists():
+            raise FileNotFoundError(
+                f"ANN index not found at {path}. "
+                "Run: python -m scripts.ann_index"
+            )
+        with np.load(path) as z:
+            stamps = json.loads(str(z["stamps"])) if "stamps" in z.files else {}
+            if stamps.get("source") != source_stamp(source) \
+                    or stamps.get("vectors") != source_stamp(vectors):
+                raise ValueError(
+                    f"ANN index {path} was not built from the current {source}; "
+                    "rebuild it: python -m scripts.ann_index"
+                )
+            return cls(
+                z["centroids"],
+                z["offsets"],
+                z["row_ids"],
+                np.load(vectors, mmap_mode="r"),
+                nprobe=int(z["nprobe"]),
+            )
+
+    def _slots(self, q: np.ndarray, nprobe: int) -> np.ndarray:
+        lists = top_k_indices(self.centroids @ q, nprobe)
+        return np.concatenate(
+            [np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists]
+        )
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 1,
+        *,
+        nprobe: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (row indices, scores) of the approximate top-k, best first.
+        With nprobe >= nlist the search is exact.
+        """
+        q = normalize_rows(query_embedding)
+        nprobe = self.nprobe if nprobe is None else nprobe
+
+        if nprobe >= self.nlist:
+            scores = self.vectors @ q
+            slots = top_k_indices(scores, k)
+            return self.row_ids[slots].astype(np.int64), scores[slots]
+
+        slots = self._slots(q, nprobe)
+        scores = self.vectors[slots] @ q
+        best = top_k_indices(scores, k)
+        return self.row_ids[slots[best]].astype(np.int64), scores[best]
+
+
+def recall_report(
+    index: IVFIndex,
+    embeddings: np.ndarray,
+    queries: np.ndarray,
+    *,
+    k: int = 10,
+    nprobes: List[int],
+    exclude: Optional[np.ndarray] = None,
+) -> List[dict]:
+    """
+    recall@k of the index against exact search, per nprobe, together with
+    mean per-query latency, so latency/recall trade-offs can be compared.
+    `exclude[i]` is a row dropped from query i's results on both sides,
+    e.g. the corpus row the query was taken from.
+    """
+    vectors = normalize_rows(embeddings)
+    queries = normalize_rows(queries)
+    n = k if exclude is None else k + 1
+
+    def top(idx, i) -> List[int]:
+        idx = idx.tolist()
+        if exclude is not None and exclude[i] in idx:
+            idx.remove(exclude[i])
+        return idx[:k]
+
+    t0 = time.perf_counter()
+    exact = [set(top(top_k_indices(vectors @ q, n), i)) for i, q in enumerate(queries)]
+    exact_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+    report = [{"nprobe": "exact", "recall": 1.0, "mean_ms": round(exact_ms, 4)}]
+    for nprobe in nprobes:
+        hits = 0
+        t0 = time.perf_counter()
+        for i, (q, truth) in enumerate(zip(queries, exact)):
+            idx, _ = index.search(q, n, nprobe=nprobe)
+            hits += len(truth.intersection(top(idx, i)))
+        ms = (time.perf_counter() - t0) * 1000 / len(queries)
+        report.append({
+            "nprobe": nprobe,
+            "recall": round(hits / (k * len(queries)), 4),
+            "mean_ms": round(ms, 4),
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the IVF index over bayt embeddings")
+    parser.add_argument("--source", type=Path, default=EMBEDDINGS_PATH)
+    parser.add_argument("--nlist", type=int, default=None, help="buckets (default: sqrt(n))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500, help="rows sampled as queries")
+    args = parser.parse_args()
+
+    embeddings = np.load(args.source, mmap_mode="r")
+
+    t0 = time.perf_counter()
+    index = IVFIndex.build(embeddings, args.nlist, nprobe=args.nprobe[len(args.nprobe) // 2])
+    print(f"Built IVF nlist={index.nlist} over {len(index)} rows "
+          f"in {time.perf_counter() - t0:.1f}s")
+
+    out = index_path(args.source)
+    index.save(out, args.source)
+    print(f"Saved → {out}")
+
+    # bayt-to-bayt queries, leave-one-out: sampled corpus rows whose own
+    # row is dropped from both rankings, so recall counts only the true
+    # neighbours and not the trivial self-hit
+    rng = np.random.default_rng(0)
+    sample = np.sort(rng.choice(len(index), size=min(args.queries, len(index)), replace=False))
+    queries = np.asarray(embeddings[sample])
+
+    report = recall_report(index, embeddings, queries, k=args.k, nprobes=args.nprobe,
+                           exclude=sample)
+    for r in report:
+        print(f"  nprobe={r['nprobe']:>5}  recall@{args.k}={r['recall']:.3f}  {r['mean_ms']:.3f} ms/query")
+
+    report_path = out.with_suffix(".report.json")
+    with report_path.open("w", encoding="utf-8") as f:
+        json.dump({"nlist": index.nlist, "k": args.k, "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# scripts/annotation_pipeline.py
+# Streaming bayt annotation pipeline: v1 → v1.1 → v1.2 → v1.3
+#
+#   python -m scripts.annotation_pipeline                       # writes v1.3
+#   python -m scripts.annotation_pipeline --emit v1 v1.1 v1.2   # + intermediates
+#   python -m scripts.annotation_pipeline --rebuild v1.2        # ignore v1.2 memo
+#
+# Each raw bayt flows through every stage in one ordered pass
+# (scripts/annotation_runner.py); no stage materializes its own file
+# unless asked to with --emit, for provenance.
+#
+# Stage outputs are memoized per row in an AppendLog under
+#   <stage>:<stage fingerprint>:<sha256 of the stage's input>
+# where the input is the previous row, the raw row if used, and any other
+# per-row input (the v1 stage's ghazal_axis), and the fingerprint covers
+# what the stage depends on besides that (model, prompt text and version,
+# rule set). Changing a normalization
+# rule therefore re-runs that stage over memoized upstream rows, and later
+# stages only for the rows whose input actually changed — no API calls.
+# The fingerprints of the last run are recorded in <v1.3>.pipeline.json.
+
+import argparse
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from prompts.corrective_prompts_v1 import AFFECT_CORRECTION_PROMPT
+from prompts.prompts_v1 import BAYT_PROMPT, PROMPT_VERSION, SYSTEM_PROMPT
+from prompts.repair_prompts_v1 import REPAIR_BAYT_HINT_PROMPT, REPAIR_SYSTEM_PROMPT
+
+from scripts import extract_bayt_annotations as v1
+from scripts import normalize_directive_bayt_hints as norm
+from scripts import repair_bayt_hints as v1_1
+from scripts.annotation_runner import add_runner_args, from_args, run_ordered
+from scripts.disk_cache import AppendLog
+from scripts.llm import cache_stats
+
+STAGE_MEMO_PATH = Path("data/cache/annotation_stages.log")
+V1_2_PATH = Path("data/annotations/bayt_annotations_v1_2.jsonl")
+
+
+class Stage(NamedTuple):
+    name: str                 # annotation version, e.g. "v1.1"
+    out_path: Path            # written when the version is emitted
+    run: Callable             # (prev_row, raw_row) -> row, or an awaitable of one
+    deps: dict                # everything besides the input the output depends on
+    uses_raw: bool = False    # whether the raw row is part of the stage's input
+    extra_input: Optional[Callable] = None  # raw_row -> further input, e.g. its ghazal_axis
+
+
+def _sha(obj) -> str:
+    payload = json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def fingerprint(stage: Stage) -> str:
+    return _sha({"stage": stage.name, "deps": stage.deps})[:16]
+
+
+def build_stages(axis_map: dict, limiter, retry) -> List[Stage]:
+    async def extract(prev, raw):
+        return await v1.annotate_bayt(raw, axis_map[raw["poem_id"]], limiter, retry)
+
+    async def repair(prev, raw):
+        new_hint = await v1_1.repair_hint(prev, raw["text"], limiter, retry)
+        return v1_1.repaired_record(prev, new_hint)
+
+    return [
+        Stage(
+            "v1", v1.OUT_PATH, extract,
+            deps={
+                "model": v1.MODEL_NAME,
+                "prompt_version": PROMPT_VERSION,
+                "prompts": _sha([SYSTEM_PROMPT, BAYT_PROMPT, AFFECT_CORRECTION_PROMPT]),
+                "affect_vocab": v1.AFFECT_VOCAB,
+                "affect_synonyms": v1.AFFECT_SYNONYMS,
+                "json_mode": v1.JSON_MODE,
+            },
+            uses_raw=True,
+            extra_input=lambda raw: {"ghazal_axis": axis_map[raw["poem_id"]]},
+        ),
+        Stage(
+            "v1.1", v1_1.OUT_PATH, repair,
+            deps={
+                "model": v1_1.MODEL_NAME,
+                "prompts": _sha([REPAIR_SYSTEM_PROMPT, REPAIR_BAYT_HINT_PROMPT]),
+                "rule": v1_1.REPAIR_RULE,
+            },
+            uses_raw=True,
+        ),
+        Stage(
+            "v1.2", V1_2_PATH,
+            lambda prev, raw: norm.normalize_row(prev, norm.EXPLICIT_DIRECTIVE_PREFIXES),
+            deps={"rule": norm.NORM_RULE, "prefixes": norm.EXPLICIT_DIRECTIVE_PREFIXES},
+        ),
+        Stage(
+            "v1.3", norm.OUT_PATH,
+            lambda prev, raw: norm.normalize_row(prev, norm.DIRECTIVE_PREFIXES),
+            deps={"rule": norm.NORM_RULE, "prefixes": norm.DIRECTIVE_PREFIXES},
+        ),
+    ]
+
+
+class Pipeline:
+    """Runs one raw row through all stages, memoizing each stage's output."""
+
+    def __init__(self, stages: List[Stage], memo: AppendLog, *, rebuild=()):
+        self.stages = stages
+        self.memo = memo
+        self.rebuild = set(rebuild)
+        self.fingerprints = {s.name: fingerprint(s) for s in stages}
+        self.stats: Dict[str, Counter] = {s.name: Counter() for s in stages}
+
+    async def run(self, raw: dict) -> List[dict]:
+        rows = []
+        prev: Optional[dict] = None
+        for stage in self.stages:
+            inputs = [prev, raw if stage.uses_raw else None]
+            if stage.extra_input is not None:
+                inputs.append(stage.extra_input(raw))
+            digest = _sha(inputs)
+            key = f"{stage.name}:{self.fingerprints[stage.name]}:{digest}"
+
+            cached = None if stage.name in self.rebuild else self.memo.get(key)
+            if cached is not None:
+                row = json.loads(cached)
+                self.stats[stage.name]["memo"] += 1
+            else:
+                row = stage.run(prev, raw)
+                if inspect.isawaitable(row):
+                    row = await row
+                self.memo.put(key, json.dumps(row, ensure_ascii=False))
+                self.stats[stage.name]["ran"] += 1
+
+            rows.append(row)
+            prev = row
+        return rows
+
+
+def _raw_rows():
+    with v1.RAW_PATH.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bayt annotation pipeline (v1 → v1.3)")
+    add_runner_args(parser)
+    parser.add_argument("--emit", nargs="*", default=[], metavar="VERSION",
+                        help="Also write these intermediate versions (v1, v1.1, v1.2)")
+    parser.add_argument("--rebuild", nargs="*", default=[], metavar="VERSION",
+                        help="Ignore memoized outputs of these stages")
+    parser.add_argument("--memo-path", type=Path, default=STAGE_MEMO_PATH)
+    args = parser.parse_args()
+
+    axis_map = v1.load_axis_map()
+    limiter, gate, retry = from_args(args)
+    stages = build_stages(axis_map, limiter, retry)
+    names = [s.name for s in stages]
+    for v in args.emit + args.rebuild:
+        if v not in names:
+            parser.error(f"unknown version {v!r}; stages: {names}")
+
+    final = stages[-1]
+    emitted = [s for s in stages if s.name in args.emit or s is final]
+
+    t0 = time.perf_counter()
+    with AppendLog(args.memo_path) as memo:
+        pipeline = Pipeline(stages, memo, rebuild=args.rebuild)
+
+        # write to temporaries so a failed run never leaves a partial version
+        tmp = {s.name: s.out_path.with_name(s.out_path.name + ".tmp") for s in emitted}
+        files = {name: path.open("w", encoding="utf-8") for name, path in tmp.items()}
+        count = 0
+
+        def write(raw: dict, rows: List[dict]):
+            nonlocal count
+            for stage, row in zip(stages, rows):
+                if stage.name in files:
+                    files[stage.name].write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+            if count % 500 == 0:
+                print(f"[PIPELINE] {count} rows")
+
+        try:
+            asyncio.run(run_ordered(_raw_rows(), pipeline.run, write, concurrency=gate))
+        finally:
+            for f in files.values():
+                f.close()
+
+        for s in emitted:
+            os.replace(tmp[s.name], s.out_path)
+
+    manifest = final.out_path.with_name(final.out_path.stem + ".pipeline.json")
+    with manifest.open("w", encoding="utf-8") as f:
+        json.dump({
+            "input": str(v1.RAW_PATH),
+            "rows": count,
+            "stages": [
+                {
+                    "version": s.name,
+                    "fingerprint": pipeline.fingerprints[s.name],
+                    "deps": s.deps,
+                    "ran": pipeline.stats[s.name]["ran"],
+                    "memo": pipeline.stats[s.name]["memo"],
+                    "emitted": str(s.out_path) if s in emitted else None,
+                }
+                for s in stages
+            ],
+        }, f, ensure_ascii=False, indent=2)
+
+    for s in stages:
+        st = pipeline.stats[s.name]
+        print(f"[PIPELINE] {s.name:5s} {pipeline.fingerprints[s.name]} "
+              f"ran={st['ran']} memo={st['memo']}")
+    print(f"[PIPELINE] {count} rows in {time.perf_counter() - t0:.1f}s → {final.out_path}")
+    print(f"[CACHE] {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+# scripts/annotation_runner.py
+# Shared asyncio runner for the annotation scripts
+#
+#   limiter = RateLimiter(rpm=500, tpm=30_000)
+#   asyncio.run(run_ordered(items, process, emit, concurrency=8))
+#
+# Keeps up to `concurrency` LLM requests in flight through one pooled
+# client (scripts/llm.py), paced by requests-per-minute and
+# tokens-per-minute token buckets. Results are emitted strictly in input
+# order, so the output file is always a prefix of the input and the
+# scripts' done-key resume keeps working after a crash.
+#
+# Failed calls are retried by RetryPolicy (exponential backoff with full
+# jitter, bounded by attempts and elapsed time, honouring retry-after).
+# 429s also feed an AIMD controller that halves the in-flight limit and
+# grows it back by ~1 per round of successes.
+
+import argparse
+import asyncio
+import email.utils
+import json
+import random
+import re
+import time
+from collections import deque
+from pathlib import Path
+from typing import Awaitable, Callable, Iterable, Optional, TypeVar, Union
+
+from scripts import llm
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+CONCURRENCY = 8
+MAX_CONCURRENCY = 32
+RPM = 500
+TPM = 30_000
+WINDOW_FACTOR = 4  # items admitted ahead of the oldest unwritten one, per slot
+
+MAX_ATTEMPTS = 8
+MAX_ELAPSED = 600.0  # seconds spent on one call, retries included
+BASE_DELAY = 0.5
+MAX_DELAY = 60.0
+
+_TRY_AGAIN = re.compile(r"try again in (\d+(?:\.\d+)?)\s*(ms|s)\b", re.IGNORECASE)
+
+
+class TokenBucket:
+    """
+    Continuous-refill token bucket: `per_minute` tokens per minute, holding
+    at most `burst` (default: one minute's worth). Waiters are served FIFO.
+    """
+
+    def __init__(self, per_minute: float, *, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst if burst is not None else per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def try_acquire(self, amount: float = 1.0) -> float:
+        """Take `amount` now if available (returns 0), else the seconds until it would be."""
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def settle(self, delta: float):
+        """Charge (or refund, if negative) tokens after the fact; may go into debt."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets for one API key."""
+
+    def __init__(self, rpm: float = RPM, tpm: float = TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    async def acquire(self, estimated_tokens: int):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(estimated_tokens)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the TPM bucket once the response reports real usage."""
+        self.tokens.settle(actual_tokens - estimated_tokens)
+
+
+class AIMDConcurrency:
+    """
+    In-flight limit with additive increase / multiplicative decrease.
+    Each success adds 1/limit (about +1 per full round of requests); a
+    throttle signal multiplies the limit by `backoff`, at most once per
+    `cooldown` seconds so one burst of 429s counts as one congestion event.
+    """
+
+    def __init__(
+        self,
+        initial: int = CONCURRENCY,
+        *,
+        minimum: int = 1,
+        maximum: int = MAX_CONCURRENCY,
+        backoff: float = 0.5,
+        cooldown: float = 2.0,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = max(maximum, initial)
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_cut = float("-inf")
+        self._waiters = deque()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self.in_flight += 1
+                fut.set_result(None)
+
+    async def acquire(self):
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def on_throttle(self):
+        now = time.monotonic()
+        if now - self._last_cut < self.cooldown:
+            return
+        self._last_cut = now
+        self.limit = max(self.minimum, self.limit * self.backoff)
+        print(f"[AIMD] throttled; concurrency → {int(self.limit)}")
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Server's retry hint in seconds: retry-after(-ms) headers or the message."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                when = email.utils.parsedate_to_datetime(value)
+                return max(0.0, when.timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    m = _TRY_AGAIN.search(str(exc))
+    if m:
+        amount = float(m.group(1))
+        return amount / 1000.0 if m.group(2).lower() == "ms" else amount
+    return None
+
+
+def classify(exc: BaseException) -> Optional[str]:
+    """'throttle' (429), 'transient' (retry), or None (give up now)."""
+    status = getattr(exc, "status_code", None)
+    if status == 429:
+        return "throttle"
+    if isinstance(exc, json.JSONDecodeError):
+        return "transient"
+    if status is not None:
+        return "transient" if status >= 500 or status in (408, 409) else None
+
+    try:
+        import openai
+    except ImportError:
+        return None
+    if isinstance(exc, openai.APIConnectionError):  # includes timeouts
+        return "transient"
+    return None
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter:
+        sleep = uniform(0, min(max_delay, base_delay · 2^(attempt-1)))
+    raised to the server's retry-after hint when there is one. Gives up
+    (re-raising the last error) after `max_attempts` or once the next sleep
+    would pass `max_elapsed` seconds since the first attempt.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_attempts: int = MAX_ATTEMPTS,
+        max_elapsed: float = MAX_ELAPSED,
+        base_delay: float = BASE_DELAY,
+        max_delay: float = MAX_DELAY,
+        controller: Optional[AIMDConcurrency] = None,
+    ):
+        self.max_attempts = max_attempts
+        self.max_elapsed = max_elapsed
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.controller = controller
+
+    def delay(self, attempt: int, hint: Optional[float] = None) -> float:
+        jitter = random.uniform(0.0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        return max(jitter, hint) if hint is not None else jitter
+
+    async def call(self, fn: Callable[[], Awaitable[R]], *, label: str = "") -> R:
+        """Await `fn()` until it succeeds or the retry budget is spent."""
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = await fn()
+            except Exception as e:
+                kind = classify(e)
+                if kind is None:
+                    raise
+                if kind == "throttle" and self.controller is not None:
+                    self.controller.on_throttle()
+
+                wait = self.delay(attempt, retry_after(e))
+                elapsed = time.monotonic() - start
+                if attempt >= self.max_attempts or elapsed + wait > self.max_elapsed:
+                    print(f"[GIVE UP] {label} after {attempt} attempts, {elapsed:.0f}s: "
+                          f"{type(e).__name__}")
+                    raise
+                print(f"[RETRY] {label} {type(e).__name__}, attempt {attempt}, "
+                      f"sleeping {wait:.1f}s")
+                await asyncio.sleep(wait)
+                continue
+
+            if self.controller is not None:
+                self.controller.on_success()
+            return result
+
+
+async def run_ordered(
+    items: Iterable[T],
+    process: Callable[[T], Awaitable[R]],
+    emit: Callable[[T, R], None],
+    *,
+    concurrency: Union[int, AIMDConcurrency] = CONCURRENCY,
+    window: Optional[int] = None,
+    skip: Optional[Callable[[T], bool]] = None,
+) -> int:
+    """
+    Run `process(item)` for every item with up to `concurrency` in flight
+    (a fixed number, or an AIMDConcurrency whose limit moves),
+    calling `emit(item, result)` in input order as results become
+    contiguous. At most `window` items are held between admission and
+    emission, which bounds memory when one item is slow.
+    Items for which `skip(item)` is true are not processed: they take no
+    concurrency slot and are emitted with result None as soon as every
+    item before them has been.
+    The first exception cancels outstanding work; everything emitted
+    before it stays emitted. Returns the number of items emitted.
+    """
+    if isinstance(concurrency, AIMDConcurrency):
+        inflight = concurrency
+        window = window or WINDOW_FACTOR * concurrency.maximum
+    else:
+        inflight = asyncio.Semaphore(concurrency)
+        window = window or WINDOW_FACTOR * concurrency
+    slots = asyncio.Semaphore(window)
+    finished = {}
+    next_seq = 0
+
+    def finish(seq: int, item: T, result):
+        nonlocal next_seq
+        finished[seq] = (item, result)
+        while next_seq in finished:
+            emit(*finished.pop(next_seq))
+            next_seq += 1
+            slots.release()
+
+    async def run(seq: int, item: T):
+        try:
+            result = await process(item)
+        finally:
+            inflight.release()
+        finish(seq, item, result)
+
+    # the first failing task stops admission and cancels the rest
+    # (asyncio.TaskGroup without its ExceptionGroup, and on Python 3.10)
+    tasks = set()
+    failure = asyncio.get_running_loop().create_future()
+
+    def on_done(task: asyncio.Task):
+        tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None and not failure.done():
+            failure.set_exception(task.exception())
+
+    async def admit():
+        for seq, item in enumerate(items):
+            await slots.acquire()
+            if skip is not None and skip(item):
+                finish(seq, item, None)
+                continue
+            await inflight.acquire()
+            task = asyncio.ensure_future(run(seq, item))
+            tasks.add(task)
+            task.add_done_callback(on_done)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    admitting = asyncio.ensure_future(admit())
+    try:
+        await asyncio.wait({admitting, failure}, return_when=asyncio.FIRST_COMPLETED)
+        if failure.done():
+            failure.result()
+        admitting.result()
+    finally:
+        for task in (admitting, *tasks):
+            task.cancel()
+        await asyncio.gather(admitting, *tasks, return_exceptions=True)
+        if failure.done():
+            failure.exception()  # retrieved: no "never retrieved" warning
+
+    return next_seq
+
+
+def add_runner_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY,
+                        help="Initial LLM requests in flight (adapted on 429s)")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--rpm", type=float, default=RPM, help="Requests per minute")
+    parser.add_argument("--tpm", type=float, default=TPM, help="Tokens per minute")
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS,
+                        help="Attempts per call before giving up")
+    parser.add_argument("--max-elapsed", type=float, default=MAX_ELAPSED,
+                        help="Seconds per call, retries included, before giving up")
+    parser.add_argument("--cache", choices=llm.CACHE_MODES, default="readwrite",
+                        help="LLM response cache: readwrite, replay (no API calls) or off")
+    parser.add_argument("--cache-path", type=Path, default=llm.LLM_CACHE_PATH)
+
+
+def from_args(args: argparse.Namespace):
+    """
+    (RateLimiter, AIMDConcurrency, RetryPolicy) from `add_runner_args` flags;
+    also points scripts/llm.py at the requested response cache.
+    """
+    llm.configure_cache(args.cache, args.cache_path)
+    limiter = RateLimiter(args.rpm, args.tpm)
+    gate = AIMDConcurrency(args.concurrency, maximum=args.max_concurrency)
+    retry = RetryPolicy(
+        max_attempts=args.max_attempts,
+        max_elapsed=args.max_elapsed,
+        controller=gate,
+    )
+    return limiter, gate, retry
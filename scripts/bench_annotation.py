@@ -0,0 +1,232 @@
+# scripts/bench_annotation.py
+# Offline throughput benchmark for the annotation scripts
+#
+#   python -m scripts.bench_annotation --poems 100 --concurrency 4 8 16
+#   python -m scripts.bench_annotation --latency-ms 800 --rate-429 0.05 --max-attempts 4
+#
+# Starts scripts/mock_llm_server.py on a local port and writes a synthetic
+# corpus under --workdir. For every --concurrency setting it runs
+#   extract_ghazal_axis → extract_bayt_annotations → repair_bayt_hints
+# as subprocesses pointed at the mock (OPENAI_BASE_URL), with the response
+# cache off and fresh outputs, and reports per script: rows, wall time,
+# rows/s, client retries/give-ups/AIMD cuts, and the requests and faults
+# the mock saw. Results are written as JSON to diff across commits and
+# settings. Mock faults are seeded, so runs are reproducible.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict
+
+from scripts import annotation_runner
+from scripts.bench_retrieval import _git_commit
+from scripts.mock_llm_server import add_fault_args, fault_args
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKDIR = Path("data/bench/annotation")
+POEMS = 50
+BAYTS_PER_POEM = 8
+CLIENT_RPM = 1_000_000  # client-side pacing off; the mock's --rpm is the limit
+CLIENT_TPM = 1_000_000_000
+
+# (module, output relative to the workdir), in pipeline order
+SCRIPTS = [
+    ("extract_ghazal_axis", "data/annotations/ghazal_axis_v1.jsonl"),
+    ("extract_bayt_annotations", "data/annotations/bayt_annotations_v1.jsonl"),
+    ("repair_bayt_hints", "data/annotations/bayt_annotations_v1_1.jsonl"),
+]
+# log lines counted from each script's stdout
+MARKERS = ("[RETRY]", "[GIVE UP]", "[AIMD]", "[REJECT]", "[FUZZY]", "[UNPACK]", "[BLANK]")
+
+_WORDS = "دل یار می عشق باده ساقی زلف چشم شب صبح گل بلبل راز خرابات رند زاهد".split()
+
+
+def make_corpus(workdir: Path, poems: int, bayts: int):
+    """Write a synthetic data/raw/ghazals_with_insight.jsonl under `workdir`."""
+    raw = workdir / "data/raw/ghazals_with_insight.jsonl"
+    raw.parent.mkdir(parents=True, exist_ok=True)
+    with raw.open("w", encoding="utf-8") as f:
+        for poem_id in range(1, poems + 1):
+            for bayt_id in range(1, bayts + 1):
+                words = [_WORDS[(poem_id * 7 + bayt_id * 3 + i) % len(_WORDS)] for i in range(8)]
+                f.write(json.dumps({
+                    "poem_id": poem_id,
+                    "bayt_id": bayt_id,
+                    "text": " ".join(words[:4]) + " / " + " ".join(words[4:]),
+                    "insight": {
+                        "bayt_summary": " ".join(words[2:7]),
+                        "ghazal_summary": " ".join(_WORDS[poem_id % 5: poem_id % 5 + 6]),
+                    },
+                }, ensure_ascii=False) + "\n")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=5) as resp:
+        return json.load(resp)
+
+
+def _env(**extra) -> dict:
+    pythonpath = os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")]))
+    return {**os.environ, "PYTHONPATH": pythonpath, **extra}
+
+
+def start_mock(port: int, workdir: Path, args: argparse.Namespace) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "scripts.mock_llm_server", "--port", str(port), *fault_args(args)],
+        cwd=workdir,
+        env=_env(),
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"mock server exited with {proc.returncode}")
+        try:
+            _get(f"http://127.0.0.1:{port}/healthz")
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("mock server did not come up")
+
+
+def _delta(after: dict, before: dict) -> Dict[str, int]:
+    keys = set(after) | set(before)
+    return {k: after.get(k, 0) - before.get(k, 0) for k in sorted(keys) if after.get(k, 0) != before.get(k, 0)}
+
+
+def run_script(module: str, out: str, workdir: Path, port: int, concurrency: int,
+               args: argparse.Namespace) -> dict:
+    env = _env(OPENAI_BASE_URL=f"http://127.0.0.1:{port}/v1", OPENAI_API_KEY="mock")
+    cmd = [
+        sys.executable, "-m", f"scripts.{module}",
+        "--cache", "off",
+        "--concurrency", str(concurrency),
+        "--max-concurrency", str(max(concurrency, args.max_concurrency)),
+        "--rpm", str(CLIENT_RPM),
+        "--tpm", str(CLIENT_TPM),
+        "--max-attempts", str(args.max_attempts),
+        "--max-elapsed", str(args.max_elapsed),
+    ]
+    if module == "extract_bayt_annotations":
+        cmd += ["--pack-size", str(args.pack_size)]
+
+    mock_url = f"http://127.0.0.1:{port}/metrics"
+    before = _get(mock_url)
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    after = _get(mock_url)
+
+    out_path = workdir / out
+    rows = 0
+    if out_path.exists():
+        with out_path.open("rb") as f:
+            rows = sum(1 for line in f if line.strip())
+
+    lines = proc.stdout.splitlines()
+    result = {
+        "ok": proc.returncode == 0,
+        "rows": rows,
+        "wall_s": round(wall, 3),
+        "rows_per_s": round(rows / wall, 2) if wall > 0 else 0.0,
+        "client": {m.strip("[]").lower().replace(" ", "_"): sum(l.startswith(m) for l in lines)
+                   for m in MARKERS},
+        "mock": {
+            "requests": after["requests"] - before["requests"],
+            "max_in_flight": after["max_in_flight"],
+            "kinds": _delta(after["kinds"], before["kinds"]),
+            "faults": _delta(after["faults"], before["faults"]),
+        },
+    }
+    if proc.returncode != 0:
+        result["stderr_tail"] = proc.stderr.strip().splitlines()[-5:]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the annotation scripts against a mock LLM")
+    parser.add_argument("--poems", type=int, default=POEMS)
+    parser.add_argument("--bayts", type=int, default=BAYTS_PER_POEM, help="Bayts per poem")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[annotation_runner.CONCURRENCY])
+    parser.add_argument("--max-concurrency", type=int, default=annotation_runner.MAX_CONCURRENCY)
+    parser.add_argument("--max-attempts", type=int, default=annotation_runner.MAX_ATTEMPTS)
+    parser.add_argument("--max-elapsed", type=float, default=annotation_runner.MAX_ELAPSED)
+    parser.add_argument("--pack-size", type=int, default=1)
+    parser.add_argument("--scripts", nargs="+", choices=[m for m, _ in SCRIPTS],
+                        default=[m for m, _ in SCRIPTS],
+                        help="Scripts to report (the ones before them still run, for their outputs)")
+    parser.add_argument("--workdir", type=Path, default=WORKDIR)
+    parser.add_argument("--out", type=Path, default=None,
+                        help="results JSON (default: <workdir>/results_<commit>.json)")
+    add_fault_args(parser)
+    args = parser.parse_args()
+
+    workdir = args.workdir.resolve()
+    make_corpus(workdir, args.poems, args.bayts)
+    port = _free_port()
+    mock = start_mock(port, workdir, args)
+    print(f"[MOCK] http://127.0.0.1:{port}/v1  {' '.join(fault_args(args))}")
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "corpus": {"poems": args.poems, "bayts_per_poem": args.bayts},
+        "mock": fault_args(args),
+        "pack_size": args.pack_size,
+        "runs": {},
+    }
+
+    try:
+        for concurrency in args.concurrency:
+            print(f"[BENCH] concurrency={concurrency}")
+            # fresh outputs, checkpoints and rejection logs for every setting
+            for d in ("data/annotations", "data/logs", "data/cache"):
+                shutil.rmtree(workdir / d, ignore_errors=True)
+
+            runs: Dict[str, dict] = {}
+            last = max(i for i, (m, _) in enumerate(SCRIPTS) if m in args.scripts)
+            for module, out in SCRIPTS[: last + 1]:
+                res = run_script(module, out, workdir, port, concurrency, args)
+                if not res["ok"]:
+                    print(f"  [FAILED] {module}: " + " | ".join(res.get("stderr_tail", [])))
+                    break
+                if module not in args.scripts:
+                    continue
+                runs[module] = res
+                c, m = res["client"], res["mock"]
+                print(f"  {module:<26} rows={res['rows']:>6}  wall={res['wall_s']:>8.2f}s  "
+                      f"{res['rows_per_s']:>8}/s  requests={m['requests']:>6}  "
+                      f"retries={c['retry']:>4}  give_ups={c['give_up']}  aimd={c['aimd']}  "
+                      f"faults={m['faults']}")
+            report["runs"][str(concurrency)] = runs
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    out = args.out or workdir / f"results_{commit}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with out.open("w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+    print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+# scripts/bench_retrieval.py
+# Micro-benchmarks for the fal request path on synthetic corpora
+#
+#   python -m scripts.bench_retrieval --rows 4200 50000 --dim 1024
+#
+# For every corpus size, a synthetic dataset + embedding matrix (and the
+# derived snapshot, int8 store and IVF index) is generated once under
+# --workdir. Each stage then runs in a fresh process, so peak RSS is
+# per stage, and reports p50/p95/p99 latency and throughput.
+# Results are written as JSON (one file per run) to diff across commits.
+
+import argparse
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from scripts.config import HARD_LENSES, SOFT_LENSES
+from scripts.language.affect_variants import AFFECT_VARIANTS
+
+WORKDIR = Path("data/bench")
+ITERS = 200
+WARMUP = 10
+QUERY_POOL = 256
+
+_WORDS = "دل یار می عشق باده ساقی زلف چشم شب صبح گل بلبل راز خرابات رند زاهد".split()
+
+
+# ---------------------------------------------------------------------------
+# synthetic corpus
+
+def corpus_dir(workdir: Path, rows: int, dim: int) -> Path:
+    return workdir / f"synth_{rows}x{dim}"
+
+
+def make_corpus(out: Path, rows: int, dim: int, seed: int = 0) -> dict:
+    """
+    Write bayts_canonical_v1.jsonl + bayts_embeddings.npy under `out`,
+    plus the snapshot, int8 store and IVF index. Returns build timings.
+    Embeddings are clustered (one centre per ghazal) so ANN recall is
+    meaningful. Existing artifacts are reused.
+    """
+    from scripts.ann_index import IVFIndex, index_path
+    from scripts.corpus_snapshot import compile_snapshot, is_fresh
+    from scripts.embedding_store import store_paths, write_store
+
+    out.mkdir(parents=True, exist_ok=True)
+    dataset = out / "bayts_canonical_v1.jsonl"
+    embeddings = out / "bayts_embeddings.npy"
+    timings = {}
+
+    rng = random.Random(seed)
+    affects = list(AFFECT_VARIANTS)
+    lenses = [None, None, None, *sorted(SOFT_LENSES), *sorted(HARD_LENSES)]
+    poems = max(1, rows // 9)
+
+    if not dataset.exists():
+        with dataset.open("w", encoding="utf-8") as f:
+            prev, bayt = None, 0
+            for i in range(rows):
+                poem = i * poems // rows + 1
+                bayt = bayt + 1 if poem == prev else 1
+                prev = poem
+                row = {
+                    "poem_id": poem,
+                    "bayt_id": bayt,
+                    "text": " ".join(rng.choices(_WORDS, k=8)) + " / "
+                            + " ".join(rng.choices(_WORDS, k=8)),
+                    "affect": rng.sample(affects, rng.randint(0, 2)),
+                    "lens": rng.choice(lenses),
+                    "ghazal_axis": f"محور {poem % 40}",
+                }
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    if not embeddings.exists():
+        t0 = time.perf_counter()
+        nrng = np.random.default_rng(seed)
+        centres = nrng.standard_normal((poems, dim)).astype(np.float32)
+        out_arr = np.lib.format.open_memmap(embeddings, mode="w+", dtype=np.float32, shape=(rows, dim))
+        for start in range(0, rows, 50_000):
+            stop = min(start + 50_000, rows)
+            poem_idx = np.arange(start, stop) * poems // rows
+            noise = nrng.standard_normal((stop - start, dim)).astype(np.float32)
+            out_arr[start:stop] = centres[poem_idx] + 0.8 * noise
+        out_arr.flush()
+        del out_arr
+        timings["generate_embeddings_s"] = time.perf_counter() - t0
+
+    if not is_fresh(dataset):
+        t0 = time.perf_counter()
+        compile_snapshot(dataset)
+        timings["compile_snapshot_s"] = time.perf_counter() - t0
+
+    if not store_paths(embeddings, "int8")[0].exists():
+        t0 = time.perf_counter()
+        write_store(np.load(embeddings, mmap_mode="r"), embeddings, "int8")
+        timings["write_int8_store_s"] = time.perf_counter() - t0
+
+    if not index_path(embeddings).exists():
+        t0 = time.perf_counter()
+        IVFIndex.build(np.load(embeddings, mmap_mode="r")).save(index_path(embeddings), embeddings)
+        timings["build_ivf_s"] = time.perf_counter() - t0
+
+    return timings
+
+
+def _use_corpus(path: Path):
+    """Point scripts.retrieval at the synthetic corpus (in this process)."""
+    from scripts import retrieval
+
+    retrieval.DATASET_PATH = path / "bayts_canonical_v1.jsonl"
+    retrieval.EMBEDDINGS_PATH = path / "bayts_embeddings.npy"
+
+
+def _queries(path: Path, n: int = QUERY_POOL) -> np.ndarray:
+    """Perturbed corpus rows, like a real query landing near some bayts."""
+    emb = np.load(path / "bayts_embeddings.npy", mmap_mode="r")
+    rng = np.random.default_rng(1)
+    idx = np.sort(rng.choice(emb.shape[0], size=min(n, emb.shape[0]), replace=False))
+    q = np.asarray(emb[idx], dtype=np.float32)
+    return q + rng.standard_normal(q.shape).astype(np.float32) * q.std()
+
+
+# ---------------------------------------------------------------------------
+# stages: each returns a zero-arg callable to time (setup is not timed)
+# and how many items one call processes
+
+def _stage_load_dataset_jsonl(path: Path):
+    from scripts import retrieval
+
+    _use_corpus(path)
+
+    def run():
+        rows = []
+        with open(retrieval.DATASET_PATH, encoding="utf-8") as f:
+            for line in f:
+                rows.append(json.loads(line))
+        return rows
+    return run, 1
+
+
+def _stage_load_dataset(path: Path):
+    from scripts import retrieval
+
+    _use_corpus(path)
+    return retrieval.load_dataset, 1
+
+
+def _stage_load_embeddings(path: Path):
+    from scripts import retrieval
+
+    _use_corpus(path)
+    return retrieval.load_embeddings, 1
+
+
+def _stage_load_embedding_store_int8(path: Path):
+    from scripts import retrieval
+
+    _use_corpus(path)
+    return lambda: retrieval.load_embedding_store("int8"), 1
+
+
+def _query_cycle(queries: np.ndarray) -> Callable[[], np.ndarray]:
+    it = iter(range(1 << 62))
+    return lambda: queries[next(it) % len(queries)]
+
+
+def _stage_retrieve_best_bayt(path: Path):
+    from scripts import retrieval
+
+    _use_corpus(path)
+    rows, emb = retrieval.load_dataset(), retrieval.load_embeddings()
+    nxt = _query_cycle(_queries(path))
+    return lambda: retrieval.retrieve_best_bayt(nxt(), rows=rows, embeddings=emb), 1
+
+
+def _stage_search_k10(path: Path):
+    from scripts import retrieval
+
+    _use_corpus(path)
+    r = retrieval.BaytRetriever(retrieval.load_dataset(), retrieval.load_embeddings())
+    nxt = _query_cycle(_queries(path))
+    return lambda: r.search(nxt(), k=10), 1
+
+
+def _stage_search_int8_rescore(path: Path):
+    from scripts import retrieval
+
+    _use_corpus(path)
+    r = retrieval.BaytRetriever(retrieval.load_dataset(), retrieval.load_embedding_store("int8"))
+    nxt = _query_cycle(_queries(path))
+    return lambda: r.search(nxt(), k=10, rescore=50), 1
+
+
+def _stage_search_ivf(path: Path):
+    from scripts import retrieval
+
+    _use_corpus(path)
+    r = retrieval.BaytRetriever(
+        retrieval.load_dataset(),
+        retrieval.load_embeddings(),
+        index=retrieval.load_ann_index(),
+    )
+    nxt = _query_cycle(_queries(path))
+    return lambda: r.search(nxt(), k=10), 1
+
+
+def _stage_search_filtered(path: Path):
+    from scripts import retrieval
+    from scripts.filters import affect_contains, lens_in
+
+    _use_corpus(path)
+    r = retrieval.BaytRetriever(retrieval.load_dataset(), retrieval.load_embeddings())
+    where = affect_contains("حسرت") & lens_in(SOFT_LENSES)
+    r.metadata  # build masks outside the timed loop
+    nxt = _query_cycle(_queries(path))
+    return lambda: r.search(nxt(), k=10, where=where), 1
+
+
+def _stage_search_batch(path: Path):
+    from scripts import retrieval
+
+    _use_corpus(path)
+    r = retrieval.BaytRetriever(retrieval.load_dataset(), retrieval.load_embeddings())
+    queries = _queries(path)
+    return lambda: r.search_batch(queries, k=10), len(queries)
+
+
+def _stage_mmr_rerank(path: Path):
+    from scripts import retrieval
+    from scripts.rerank import mmr_rerank
+
+    _use_corpus(path)
+    r = retrieval.BaytRetriever(retrieval.load_dataset(), retrieval.load_embeddings())
+    hits = [r.search(q, k=50) for q in _queries(path, 32)]
+    vecs = [r.store.vectors(h.indices) for h in hits]
+    nxt = _query_cycle(np.arange(len(hits)))
+
+    def run():
+        i = int(nxt())
+        return mmr_rerank(hits[i], vecs[i], 5, max_per_poem=1)
+    return run, 1
+
+
+def _stage_assemble_fal(path: Path):
+    from scripts import retrieval
+    from scripts.fal_assembly import assemble_fal
+    from scripts.language.lens_hard import LENS_VARIANTS_HARD
+    from scripts.language.lens_soft import LENS_VARIANTS_SOFT
+
+    _use_corpus(path)
+    rows = retrieval.load_dataset()
+    sample = [rows[i] for i in range(0, len(rows), max(1, len(rows) // 256))]
+    nxt = _query_cycle(np.arange(len(sample)))
+    return lambda: assemble_fal(
+        sample[int(nxt())],
+        affect_variants=AFFECT_VARIANTS,
+        lens_soft=LENS_VARIANTS_SOFT,
+        lens_hard=LENS_VARIANTS_HARD,
+    ), 1
+
+
+STAGES: Dict[str, Callable] = {
+    "load_dataset_jsonl": _stage_load_dataset_jsonl,
+    "load_dataset": _stage_load_dataset,
+    "load_embeddings": _stage_load_embeddings,
+    "load_embedding_store_int8": _stage_load_embedding_store_int8,
+    "retrieve_best_bayt": _stage_retrieve_best_bayt,
+    "search_k10": _stage_search_k10,
+    "search_int8_rescore": _stage_search_int8_rescore,
+    "search_ivf": _stage_search_ivf,
+    "search_filtered": _stage_search_filtered,
+    "search_batch": _stage_search_batch,
+    "mmr_rerank": _stage_mmr_rerank,
+    "assemble_fal": _stage_assemble_fal,
+}
+
+# loading stages touch the disk; fewer iterations keep large corpora tractable
+SLOW_STAGES = {"load_dataset_jsonl", "load_dataset", "load_embeddings",
+               "retrieve_best_bayt", "search_batch"}
+
+
+# ---------------------------------------------------------------------------
+# runner
+
+def summarize(samples_ns: List[int], items_per_call: int) -> dict:
+    s = np.array(samples_ns, dtype=np.float64) / 1e6
+    total_s = s.sum() / 1000
+    return {
+        "iterations": len(s),
+        "p50_ms": round(float(np.percentile(s, 50)), 4),
+        "p95_ms": round(float(np.percentile(s, 95)), 4),
+        "p99_ms": round(float(np.percentile(s, 99)), 4),
+        "mean_ms": round(float(s.mean()), 4),
+        "throughput_per_s": round(len(s) * items_per_call / total_s, 2) if total_s else None,
+    }
+
+
+def run_stage(stage: str, path: str, iters: int, warmup: int) -> dict:
+    """Run in a fresh process: set up, warm up, time `iters` calls."""
+    fn, items = STAGES[stage](Path(path))
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(iters):
+        t0 = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - t0)
+
+    result = summarize(samples, items)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process.
+    Prefers VmHWM (reset on exec) over ru_maxrss, which Linux carries over
+    from the parent that spawned us.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fal request path")
+    parser.add_argument("--rows", type=int, nargs="+", default=[4200])
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--stages", nargs="+", choices=sorted(STAGES), default=list(STAGES))
+    parser.add_argument("--iters", type=int, default=ITERS)
+    parser.add_argument("--warmup", type=int, default=WARMUP)
+    parser.add_argument("--workdir", type=Path, default=WORKDIR)
+    parser.add_argument("--out", type=Path, default=None,
+                        help="results JSON (default: <workdir>/results_<commit>.json)")
+    args = parser.parse_args()
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "dim": args.dim,
+        "corpora": {},
+    }
+
+    ctx = get_context("spawn")
+    for rows in args.rows:
+        path = corpus_dir(args.workdir, rows, args.dim)
+        print(f"[SETUP] {rows}x{args.dim} → {path}")
+        setup = make_corpus(path, rows, args.dim)
+
+        stages = {}
+        for stage in args.stages:
+            iters = max(5, args.iters // 10) if stage in SLOW_STAGES else args.iters
+            warmup = min(args.warmup, 2) if stage in SLOW_STAGES else args.warmup
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                res = pool.submit(run_stage, stage, str(path), iters, warmup).result()
+            stages[stage] = res
+            print(f"  {stage:<28} p50={res['p50_ms']:>9.3f}ms  p95={res['p95_ms']:>9.3f}ms  "
+                  f"p99={res['p99_ms']:>9.3f}ms  {res['throughput_per_s']:>10}/s  "
+                  f"rss={res['peak_rss_mb']}MB")
+
+        report["corpora"][str(rows)] = {"setup": setup, "stages": stages}
+
+    out = args.out or args.workdir / f"results_{commit}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with out.open("w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
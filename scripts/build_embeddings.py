@@ -0,0 +1,267 @@
+# scripts/build_embeddings.py
+# Resumable, incremental bayt embedding build
+#
+#   python -m scripts.build_embeddings                   # default embedder
+#   python -m scripts.build_embeddings --embedder openai --batch-size 128
+#
+# writes next to EMBEDDINGS_PATH:
+#   bayts_embeddings.npy            (n, dim) float32, one row per dataset line
+#   bayts_embeddings.rows.json      rows digest, model id, dim, embeddings stamp
+#   bayts_embeddings.content.npy    per row: poem_id, bayt_id, content hash
+#
+# The dataset is streamed twice: once to hash every row (cheap), once to
+# embed in batches into a preallocated memmap (`*.building.npy`).
+# Progress is checkpointed in `*.build.json`; after a crash the next run
+# continues from the last checkpointed row.
+#
+# Rows whose (poem_id, bayt_id) and content hash (text, bayt_hint, affect)
+# match the previous build with the same model are copied from the old
+# embeddings instead of re-embedded, so a new annotation version only
+# pays for the rows that actually changed.
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from scripts.config import QUERY_EMBEDDER
+from scripts.corpus_snapshot import content_hash, row_digest, rows_manifest_path, source_stamp
+from scripts.embedders import EMBEDDERS, Embedder, get_embedder
+from scripts.retrieval import DATASET_PATH, EMBEDDINGS_PATH
+
+BATCH_SIZE = 64
+CHECKPOINT_ROWS = 1024  # flush + checkpoint at least this often
+
+CONTENT_DTYPE = np.dtype([("poem_id", "<i4"), ("bayt_id", "<i4"), ("hash", "S16")])
+
+
+def content_manifest_path(embeddings_path: Path) -> Path:
+    """bayts_embeddings.npy -> bayts_embeddings.content.npy"""
+    return embeddings_path.with_name(f"{embeddings_path.stem}.content.npy")
+
+
+def building_paths(embeddings_path: Path) -> Tuple[Path, Path]:
+    """(partial embeddings, checkpoint) for an in-progress build."""
+    return (
+        embeddings_path.with_name(f"{embeddings_path.stem}.building.npy"),
+        embeddings_path.with_name(f"{embeddings_path.stem}.build.json"),
+    )
+
+
+def embedding_text(row: dict) -> str:
+    """The text a bayt is embedded as: the couplet, its hint and affects."""
+    parts = [row["text"]]
+    if row.get("bayt_hint"):
+        parts.append(row["bayt_hint"])
+    if row.get("affect"):
+        parts.append("، ".join(row["affect"]))
+    return "\n".join(parts)
+
+
+def _stream(dataset: Path) -> Iterator[dict]:
+    with dataset.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def hash_dataset(dataset: Path) -> np.ndarray:
+    """First pass: (poem_id, bayt_id, content hash) for every row, in order."""
+    entries = [(r["poem_id"], r["bayt_id"], content_hash(r)) for r in _stream(dataset)]
+    return np.array(entries, dtype=CONTENT_DTYPE)
+
+
+def _atomic_json(path: Path, obj: dict):
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _previous_build(embeddings_path: Path, model_id: str, dim: int):
+    """
+    Old embeddings (mmap) and {(poem_id, bayt_id): (row, hash)} when the
+    previous build used the same model and its manifest still describes
+    the embeddings file on disk; otherwise (None, {}).
+    """
+    manifest = rows_manifest_path(embeddings_path)
+    content = content_manifest_path(embeddings_path)
+    if not (embeddings_path.exists() and manifest.exists() and content.exists()):
+        return None, {}
+
+    with manifest.open("r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if (
+        meta.get("model_id") != model_id
+        or meta.get("dim") != dim
+        or meta.get("embeddings") != source_stamp(embeddings_path)
+    ):
+        return None, {}
+
+    old = np.load(content)
+    lookup = {
+        (int(e["poem_id"]), int(e["bayt_id"])): (i, e["hash"])
+        for i, e in enumerate(old)
+    }
+    return np.load(embeddings_path, mmap_mode="r"), lookup
+
+
+def plan_build(
+    entries: np.ndarray,
+    lookup: dict,
+) -> np.ndarray:
+    """Old row index to copy from for each new row, or -1 to embed it."""
+    source = np.full(len(entries), -1, dtype=np.int64)
+    for i, e in enumerate(entries):
+        hit = lookup.get((int(e["poem_id"]), int(e["bayt_id"])))
+        if hit is not None and hit[1] == e["hash"]:
+            source[i] = hit[0]
+    return source
+
+
+def _resume_point(checkpoint: Path, partial: Path, expected: dict) -> int:
+    """Rows already written by an interrupted build with the same inputs."""
+    if not (checkpoint.exists() and partial.exists()):
+        return 0
+    with checkpoint.open("r", encoding="utf-8") as f:
+        state = json.load(f)
+    if any(state.get(k) != v for k, v in expected.items()):
+        return 0
+    return int(state["rows_done"])
+
+
+def build_embeddings(
+    embedder: Embedder,
+    dataset: Path = DATASET_PATH,
+    out: Path = EMBEDDINGS_PATH,
+    *,
+    batch_size: int = BATCH_SIZE,
+    checkpoint_rows: int = CHECKPOINT_ROWS,
+    max_workers: Optional[int] = None,
+    full: bool = False,
+) -> dict:
+    """
+    Build (or incrementally rebuild) `out` from `dataset`.
+    Returns counts: rows, embedded, reused, resumed_at.
+    """
+    out.parent.mkdir(parents=True, exist_ok=True)
+    partial, checkpoint = building_paths(out)
+    model_id, dim = embedder.model_id, embedder.dim
+
+    entries = hash_dataset(dataset)
+    n = len(entries)
+    old, lookup = (None, {}) if full else _previous_build(out, model_id, dim)
+    source = plan_build(entries, lookup)
+
+    expected = {
+        "dataset": source_stamp(dataset),
+        "model_id": model_id,
+        "dim": dim,
+        "rows": n,
+        "full": full,
+    }
+    start = _resume_point(checkpoint, partial, expected)
+    if start:
+        arr = np.lib.format.open_memmap(partial, mode="r+")
+        print(f"[EMBED] resuming at row {start}/{n}")
+    else:
+        arr = np.lib.format.open_memmap(partial, mode="w+", dtype=np.float32, shape=(n, dim))
+
+    embedded = reused = 0
+    since_checkpoint = 0
+    pending_rows: List[int] = []
+    pending_texts: List[str] = []
+
+    def flush_pending():
+        nonlocal embedded
+        if pending_rows:
+            arr[pending_rows] = embedder.embed(
+                pending_texts, batch_size=batch_size, max_workers=max_workers
+            )
+            embedded += len(pending_rows)
+            pending_rows.clear()
+            pending_texts.clear()
+
+    # embed `batch_size × workers` texts per round so a thread pool stays busy
+    round_size = batch_size * max(1, max_workers or 1)
+
+    for i, row in enumerate(_stream(dataset)):
+        if i < start:
+            continue
+        if source[i] >= 0:
+            arr[i] = old[source[i]]
+            reused += 1
+        else:
+            pending_rows.append(i)
+            pending_texts.append(embedding_text(row))
+            if len(pending_texts) >= round_size:
+                flush_pending()
+
+        since_checkpoint += 1
+        if since_checkpoint >= checkpoint_rows and not pending_rows:
+            arr.flush()
+            _atomic_json(checkpoint, {**expected, "rows_done": i + 1})
+            since_checkpoint = 0
+
+    flush_pending()
+    arr.flush()
+    del arr
+
+    # describe the new file before it replaces the old one, so a crash in
+    # between leaves a manifest that no longer matches (and is ignored)
+    _atomic_json(rows_manifest_path(out), {
+        "rows_digest": row_digest(zip(
+            entries["poem_id"].tolist(), entries["bayt_id"].tolist(), entries["hash"].tolist()
+        )),
+        "model_id": model_id,
+        "dim": dim,
+        "rows": n,
+        "dataset": str(dataset),
+        "embeddings": source_stamp(partial),
+    })
+    content = content_manifest_path(out)
+    np.save(content.with_name(content.stem + ".tmp.npy"), entries)
+    os.replace(content.with_name(content.stem + ".tmp.npy"), content)
+    os.replace(partial, out)
+    checkpoint.unlink(missing_ok=True)
+
+    return {"rows": n, "embedded": embedded, "reused": reused, "resumed_at": start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build bayt embeddings (resumable, incremental)")
+    parser.add_argument("--dataset", type=Path, default=DATASET_PATH)
+    parser.add_argument("--out", type=Path, default=EMBEDDINGS_PATH)
+    parser.add_argument("--embedder", choices=sorted(EMBEDDERS), default=QUERY_EMBEDDER)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Concurrent embedding batches (I/O-bound backends)")
+    parser.add_argument("--checkpoint-rows", type=int, default=CHECKPOINT_ROWS)
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the previous build and re-embed every row")
+    args = parser.parse_args()
+
+    embedder = get_embedder(args.embedder)
+    t0 = time.perf_counter()
+    stats = build_embeddings(
+        embedder,
+        args.dataset,
+        args.out,
+        batch_size=args.batch_size,
+        checkpoint_rows=args.checkpoint_rows,
+        max_workers=args.workers,
+        full=args.full,
+    )
+    print(f"[EMBED] {stats['rows']} rows with {embedder.model_id}: "
+          f"{stats['embedded']} embedded, {stats['reused']} reused "
+          f"in {time.perf_counter() - t0:.1f}s → {args.out}")
+    print("[EMBED] derived artifacts (embedding_store, ann_index, knn_graph) "
+          "must be rebuilt against the new embeddings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# scripts/checkpoint.py
+# Sidecar resume checkpoints for the annotation passes
+#
+#   <out>.jsonl.ckpt   {"input_offset": .., "output_offset": .., "done": "<zlib+base64>", ...}
+#
+# A pass reads an input JSONL and appends one output record per item, in
+# input order (scripts/annotation_runner.py). The checkpoint records how
+# far both files got, plus the processed keys packed into a compressed
+# uint64 array, so a restart seeks straight to the first unprocessed
+# input line instead of re-parsing the whole output.
+#
+# The checkpoint is written every `every` records (atomically). On resume
+# the output is truncated back to the checkpointed size, which drops both
+# a torn final line and any records written after the last checkpoint;
+# those few items are simply redone (for free, via the LLM response cache).
+#
+# Outputs written before checkpoints existed are migrated once: the output
+# is scanned for its keys and the input is read from the top.
+
+import base64
+import json
+import os
+import zlib
+from array import array
+from pathlib import Path
+from typing import Callable, Iterator, Set, Tuple
+
+from scripts.corpus_snapshot import source_stamp
+
+CHECKPOINT_EVERY = 50
+
+
+def bayt_key(row: dict) -> int:
+    """(poem_id, bayt_id) packed into one integer."""
+    return (row["poem_id"] << 16) | row["bayt_id"]
+
+
+def poem_key(row: dict) -> int:
+    return row["poem_id"]
+
+
+def pack_keys(keys: Set[int]) -> str:
+    return base64.b64encode(zlib.compress(array("Q", sorted(keys)).tobytes())).decode("ascii")
+
+
+def unpack_keys(blob: str) -> Set[int]:
+    arr = array("Q")
+    arr.frombytes(zlib.decompress(base64.b64decode(blob)))
+    return set(arr)
+
+
+def _last_full_line(path: Path) -> int:
+    """Size of `path` up to and including its last newline."""
+    size = path.stat().st_size
+    with path.open("rb") as f:
+        pos = size
+        while pos > 0:
+            step = min(65536, pos)
+            f.seek(pos - step)
+            chunk = f.read(step)
+            nl = chunk.rfind(b"\n")
+            if nl >= 0:
+                return pos - step + nl + 1
+            pos -= step
+    return 0
+
+
+class Checkpoint:
+    """Resume state for one input → output JSONL pass."""
+
+    def __init__(
+        self,
+        input_path: Path,
+        out_path: Path,
+        key: Callable[[dict], int] = bayt_key,
+        *,
+        every: int = CHECKPOINT_EVERY,
+    ):
+        self.input_path = input_path
+        self.out_path = out_path
+        self.path = out_path.with_name(out_path.name + ".ckpt")
+        self.key = key
+        self.every = every
+        self.done: Set[int] = set()
+        self.input_offset = 0
+        self.output_offset = 0
+        self._pending = 0
+        self._out = None
+        self._load()
+
+    def _load(self):
+        if self.path.exists() and self.out_path.exists():
+            with self.path.open("r", encoding="utf-8") as f:
+                state = json.load(f)
+            out_size = self.out_path.stat().st_size
+            if (
+                state.get("input_stamp") == source_stamp(self.input_path)
+                and state["output_offset"] <= out_size
+            ):
+                self.done = unpack_keys(state["done"])
+                self.input_offset = state["input_offset"]
+                self.output_offset = state["output_offset"]
+                return
+            print(f"[RESUME] {self.path} is stale; rescanning {self.out_path}")
+
+        # no usable checkpoint: one scan of the existing output
+        if self.out_path.exists():
+            self.output_offset = _last_full_line(self.out_path)
+            with self.out_path.open("rb") as f:
+                for line in f.read(self.output_offset).splitlines():
+                    if line.strip():
+                        self.done.add(self.key(json.loads(line)))
+
+    def open_output(self):
+        """Append handle on the output, truncated back to the checkpoint."""
+        self.out_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.out_path.exists() and self.out_path.stat().st_size > self.output_offset:
+            with self.out_path.open("r+b") as f:
+                f.truncate(self.output_offset)
+        self._out = self.out_path.open("a", encoding="utf-8")
+        return self._out
+
+    def lines(self) -> Iterator[Tuple[dict, int]]:
+        """(row, byte offset just past its line) from the checkpointed input offset on."""
+        with self.input_path.open("rb") as f:
+            f.seek(self.input_offset)
+            offset = self.input_offset
+            for raw in f:
+                offset += len(raw)
+                if raw.strip():
+                    yield json.loads(raw), offset
+
+    def is_done(self, row: dict) -> bool:
+        return self.key(row) in self.done
+
+    def advance(self, rows, input_offset: int):
+        """Record `rows` as written and the input consumed up to `input_offset`."""
+        for row in rows:
+            self.done.add(self.key(row))
+        self.input_offset = input_offset
+        self._pending += 1
+        if self._pending >= self.every:
+            self.save()
+
+    def save(self):
+        if self._out is not None:
+            self._out.flush()
+            self.output_offset = self._out.tell()
+        state = {
+            "input": str(self.input_path),
+            "input_stamp": source_stamp(self.input_path),
+            "input_offset": self.input_offset,
+            "output_offset": self.output_offset,
+            "count": len(self.done),
+            "done": pack_keys(self.done),
+        }
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path)
+        self._pending = 0
+
+    def close(self):
+        if self._out is not None:
+            self.save()
+            self._out.close()
+            self._out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
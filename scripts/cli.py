@@ -1,50 +1,103 @@
 # scripts/cli.py
+#
+# Startup is kept to argparse + the daemon client: NumPy, retrieval, the
+# embedder backends and the language tables are imported only on the
+# in-process path (see scripts/test_startup.py for the budget).
 
 import argparse
-import numpy as np
-
-from scripts.retrieval import (
-    load_dataset,
-    load_embeddings,
-    retrieve_best_bayt,
-)
-from scripts.fal_assembly import assemble_fal
-from scripts.language.affect_variants import AFFECT_VARIANTS
-from scripts.language.lens_soft import LENS_VARIANTS_SOFT
-from scripts.language.lens_hard import LENS_VARIANTS_HARD
-
-# TEMP: stub until you plug a real embedder
-def embed_query(text: str) -> np.ndarray:
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from scripts.config import QUERY_EMBEDDER
+from scripts.daemon_client import SOCKET_PATH, request_fal
+from scripts import tracing
+
+if TYPE_CHECKING:
+    import numpy as np
+    from scripts.query_cache import QueryEmbeddingCache
+
+_query_cache = None
+
+
+def get_query_cache(embedder: str = QUERY_EMBEDDER) -> "QueryEmbeddingCache":
+    """
+    Process-wide query cache in front of the named embedder backend
+    (scripts/embedders.py). The first call picks the backend.
+    """
+    global _query_cache
+    if _query_cache is None:
+        from scripts.embedders import get_embedder
+        from scripts.query_cache import QueryEmbeddingCache
+
+        backend = get_embedder(embedder)
+        _query_cache = QueryEmbeddingCache(
+            backend.embed_one,
+            backend.model_id,
+            embed_batch=backend.embed,
+        )
+    return _query_cache
+
+
+@tracing.traced()
+def embed_query(text: str) -> "np.ndarray":
     """
-    Replace this with a real embedding model.
-    For now, this is a placeholder.
+    Embed a user query through the normalization + LRU/disk cache
+    (scripts/query_cache.py); only cache misses reach the model.
     """
-    raise NotImplementedError("Query embedding not wired yet.")
+    return get_query_cache().get(text)
 
 
 def main():
     parser = argparse.ArgumentParser(description="YaarAI Fal-e-Hafez CLI")
     parser.add_argument("query", type=str, help="User question (Persian)")
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="Always load and retrieve in this process")
+    parser.add_argument("--socket", type=Path, default=SOCKET_PATH,
+                        help="Daemon socket (see scripts/daemon.py)")
+    parser.add_argument("--embedder", default=QUERY_EMBEDDER,
+                        help="Query embedder backend, see scripts/embedders.py "
+                             "(must match the bayt embeddings)")
+    parser.add_argument("--trace", type=Path, nargs="?", const=tracing.TRACE_DIR / "cli.jsonl",
+                        help="Append per-stage spans as JSONL (default: %(const)s)")
+    parser.add_argument("--profile", action="store_true",
+                        help="cProfile this request; stats go to data/traces/")
     args = parser.parse_args()
 
-    rows = load_dataset()
-    embeddings = load_embeddings()
+    if args.trace:
+        tracing.enable(args.trace)
+
+    if not args.no_daemon:
+        reply = request_fal(args.query, args.socket)
+        if reply is not None:
+            print(reply["fal"])
+            return
+
+    from scripts.fal_assembly import assemble_fal
+    from scripts.language.affect_variants import AFFECT_VARIANTS
+    from scripts.language.lens_soft import LENS_VARIANTS_SOFT
+    from scripts.language.lens_hard import LENS_VARIANTS_HARD
+    from scripts.retrieval import BaytRetriever, load_dataset, load_embeddings
+
+    try:
+        get_query_cache(args.embedder)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with tracing.request("fal", profile=args.profile):
+        retriever = BaytRetriever(load_dataset(), load_embeddings())
 
-    query_emb = embed_query(args.query)
-    bayt_row = retrieve_best_bayt(
-        query_emb,
-        rows=rows,
-        embeddings=embeddings,
-    )
+        query_emb = embed_query(args.query)
+        bayt_row = retriever.search(query_emb, k=1).rows[0]
 
-    out = assemble_fal(
-        bayt_row,
-        affect_variants=AFFECT_VARIANTS,
-        lens_soft=LENS_VARIANTS_SOFT,
-        lens_hard=LENS_VARIANTS_HARD,
-    )
+        out = assemble_fal(
+            bayt_row,
+            affect_variants=AFFECT_VARIANTS,
+            lens_soft=LENS_VARIANTS_SOFT,
+            lens_hard=LENS_VARIANTS_HARD,
+        )
 
     print(out)
+    tracing.disable()
 
 
 if __name__ == "__main__":
@@ -14,3 +14,7 @@ HARD_LENSES = {
 }
 
 DEFAULT_MARKER = "بیت گویاست"
+
+# query embedder backend (scripts/embedders.py); must match the one
+# used to build data/embeddings/bayts_embeddings.npy
+QUERY_EMBEDDER = "hashing"
@@ -0,0 +1,306 @@
+# scripts/corpus_snapshot.py
+# Compiled, memory-mappable snapshot of the canonical bayt dataset
+#
+#   python -m scripts.corpus_snapshot
+#
+# compiles data/datasets/bayts_canonical_v1.jsonl into a directory
+# bayts_canonical_v1.snapshot/ holding:
+#   poem_id.npy, bayt_id.npy     int32 columns
+#   affect.npy                   (n, MAX_AFFECT) int16 codes, -1 = empty slot
+#   lens.npy                     int16 code, -1 = no lens
+#   ghazal_axis.npy              int32 code, -1 = not annotated
+#   text.bin + text_offsets.npy  one UTF-8 blob, row i = blob[off[i]:off[i+1]]
+#   extra.bin + extra_offsets.npy  any other fields, one JSON object per row
+#   meta.json                    category tables, row digest, source stamp
+#
+# Rows are hydrated into BaytRow dicts only when indexed.
+
+import argparse
+import hashlib
+import json
+import mmap
+import numpy as np
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from scripts.filters import MetadataIndex
+from scripts.types import BaytRow
+
+SNAPSHOT_VERSION = 2
+MAX_AFFECT = 2
+CORE_FIELDS = ("poem_id", "bayt_id", "text", "affect", "lens", "ghazal_axis")
+CONTENT_HASH_SIZE = 16
+
+
+def snapshot_dir(dataset_path: Path) -> Path:
+    """bayts_canonical_v1.jsonl -> bayts_canonical_v1.snapshot/"""
+    return dataset_path.with_name(f"{dataset_path.stem}.snapshot")
+
+
+def content_hash(row: dict) -> bytes:
+    """16-byte hash of the fields that feed the embedding."""
+    payload = json.dumps(
+        [row["text"], row.get("bayt_hint"), row.get("affect") or []],
+        ensure_ascii=False,
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=CONTENT_HASH_SIZE).digest()
+
+
+def row_digest(entries: Iterable[Tuple[int, int, bytes]]) -> str:
+    """
+    sha256 over the ordered (poem_id, bayt_id, content_hash) sequence.
+    Two artifacts with the same digest agree on which bayt each row is
+    and on the text, hint and affects it was embedded from.
+    """
+    h = hashlib.sha256()
+    for poem_id, bayt_id, content in entries:
+        h.update(f"{poem_id}:{bayt_id}:".encode("ascii"))
+        # NumPy "S16" columns drop trailing NUL bytes; pad them back
+        h.update(content.ljust(CONTENT_HASH_SIZE, b"\0"))
+    return h.hexdigest()
+
+
+def rows_digest(rows: Iterable[dict]) -> str:
+    """`row_digest` of dataset rows."""
+    return row_digest((r["poem_id"], r["bayt_id"], content_hash(r)) for r in rows)
+
+
+def source_stamp(path: Path) -> dict:
+    st = path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _blob(chunks: List[bytes]) -> Tuple[np.ndarray, bytes]:
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(c) for c in chunks])
+    return offsets, b"".join(chunks)
+
+
+def _codes(values: List, table: dict) -> List[int]:
+    out = []
+    for v in values:
+        if v is None:
+            out.append(-1)
+        else:
+            out.append(table.setdefault(v, len(table)))
+    return out
+
+
+def compile_snapshot(dataset_path: Path, out_dir: Optional[Path] = None) -> Path:
+    """Compile the JSONL dataset into a snapshot directory."""
+    out_dir = out_dir or snapshot_dir(dataset_path)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    with dataset_path.open("r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+
+    affect_table, lens_table, axis_table = {}, {}, {}
+
+    affect = np.full((len(rows), MAX_AFFECT), -1, dtype=np.int16)
+    for i, r in enumerate(rows):
+        labels = r.get("affect") or []
+        if len(labels) > MAX_AFFECT:
+            raise ValueError(
+                f"row {i} has {len(labels)} affect labels (max {MAX_AFFECT})"
+            )
+        affect[i, :len(labels)] = _codes(labels, affect_table)
+
+    lens = np.array(_codes([r.get("lens") for r in rows], lens_table), dtype=np.int16)
+    axis = np.array(_codes([r.get("ghazal_axis") for r in rows], axis_table), dtype=np.int32)
+
+    text_offsets, text = _blob([r["text"].encode("utf-8") for r in rows])
+    extra_offsets, extra = _blob([
+        json.dumps(
+            {k: v for k, v in r.items() if k not in CORE_FIELDS},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        for r in rows
+    ])
+
+    np.save(out_dir / "poem_id.npy", np.array([r["poem_id"] for r in rows], dtype=np.int32))
+    np.save(out_dir / "bayt_id.npy", np.array([r["bayt_id"] for r in rows], dtype=np.int32))
+    np.save(out_dir / "affect.npy", affect)
+    np.save(out_dir / "lens.npy", lens)
+    np.save(out_dir / "ghazal_axis.npy", axis)
+    np.save(out_dir / "text_offsets.npy", text_offsets)
+    np.save(out_dir / "extra_offsets.npy", extra_offsets)
+    (out_dir / "text.bin").write_bytes(text)
+    (out_dir / "extra.bin").write_bytes(extra)
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "rows": len(rows),
+        "rows_digest": rows_digest(rows),
+        "source": source_stamp(dataset_path),
+        "affect": list(affect_table),
+        "lens": list(lens_table),
+        "ghazal_axis": list(axis_table),
+    }
+    with (out_dir / "meta.json").open("w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    return out_dir
+
+
+def is_fresh(dataset_path: Path, out_dir: Optional[Path] = None) -> bool:
+    """True if a snapshot exists and was compiled from the current dataset file."""
+    meta_path = (out_dir or snapshot_dir(dataset_path)) / "meta.json"
+    if not meta_path.exists() or not dataset_path.exists():
+        return False
+    with meta_path.open("r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return (
+        meta.get("version") == SNAPSHOT_VERSION
+        and meta.get("source") == source_stamp(dataset_path)
+    )
+
+
+def _open_blob(path: Path, size: int):
+    """Read-only mapping of a blob file; slicing it yields bytes."""
+    if not size:
+        return b""
+    with path.open("rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class Corpus(Sequence[BaytRow]):
+    """
+    Read-only, list-like view over a snapshot.
+
+    Columns are memory-mapped for the vectorized filters. The hot path
+    (hydrating the few rows a search returns) reads Python-list copies of
+    the small columns and slices the text blob directly, since indexing a
+    memmap one scalar at a time costs more than the rest of the row.
+    """
+
+    def __init__(self, path: Path):
+        with (path / "meta.json").open("r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        def col(name):
+            return np.load(path / f"{name}.npy", mmap_mode="r")
+
+        self.path = path
+        self.poem_ids = col("poem_id")
+        self.bayt_ids = col("bayt_id")
+        self.affect_codes = col("affect")
+        self.lens_codes = col("lens")
+        self.axis_codes = col("ghazal_axis")
+
+        self.affect_labels = self.meta["affect"]
+        self.lens_labels = self.meta["lens"]
+        self.axis_labels = self.meta["ghazal_axis"]
+
+        self._poem_id = self.poem_ids.tolist()
+        self._bayt_id = self.bayt_ids.tolist()
+        affect_rows = [tuple(codes) for codes in self.affect_codes.tolist()]
+        combos = {  # one label tuple per distinct affect combination
+            codes: tuple(self.affect_labels[c] for c in codes if c >= 0)
+            for codes in set(affect_rows)
+        }
+        self._affect = [combos[codes] for codes in affect_rows]
+        self._lens = [self.lens_labels[c] if c >= 0 else None for c in self.lens_codes.tolist()]
+        self._axis = [self.axis_labels[c] if c >= 0 else None for c in self.axis_codes.tolist()]
+
+        self._text_offsets = col("text_offsets").tolist()
+        self._extra_offsets = col("extra_offsets").tolist()
+        self._text = _open_blob(path / "text.bin", self._text_offsets[-1])
+        self._extra = _open_blob(path / "extra.bin", self._extra_offsets[-1])
+
+    @property
+    def digest(self) -> str:
+        return self.meta["rows_digest"]
+
+    def __len__(self) -> int:
+        return self.meta["rows"]
+
+    def _row(self, i: int) -> BaytRow:
+        text_off, extra_off = self._text_offsets, self._extra_offsets
+        row = {
+            "poem_id": self._poem_id[i],
+            "bayt_id": self._bayt_id[i],
+            "text": self._text[text_off[i]:text_off[i + 1]].decode("utf-8"),
+            "affect": list(self._affect[i]),
+            "lens": self._lens[i],
+        }
+        if self._axis[i] is not None:
+            row["ghazal_axis"] = self._axis[i]
+        extra = self._extra[extra_off[i]:extra_off[i + 1]]
+        if extra != b"{}":
+            row.update(json.loads(extra))
+        return row
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._row(j) for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._row(i)
+
+    def __iter__(self) -> Iterator[BaytRow]:
+        for i in range(len(self)):
+            yield self._row(i)
+
+    def metadata_index(self) -> MetadataIndex:
+        """Filter masks straight from the category codes, without hydrating rows."""
+        affect = {
+            label: (self.affect_codes == c).any(axis=1)
+            for c, label in enumerate(self.affect_labels)
+        }
+        lens = {label: self.lens_codes == c for c, label in enumerate(self.lens_labels)}
+        lens[None] = self.lens_codes < 0
+        axis = {label: self.axis_codes == c for c, label in enumerate(self.axis_labels)}
+        return MetadataIndex(len(self), affect, lens, axis)
+
+    def check_alignment(self, embeddings_path: Path):
+        """Raise ValueError unless `embeddings_path` has this corpus's rows."""
+        check_alignment(self.digest, len(self), embeddings_path)
+
+
+def rows_manifest_path(embeddings_path: Path) -> Path:
+    """bayts_embeddings.npy -> bayts_embeddings.rows.json"""
+    return embeddings_path.with_name(f"{embeddings_path.stem}.rows.json")
+
+
+def check_alignment(digest: str, n_rows: int, embeddings_path: Path):
+    """
+    Raise ValueError unless the embedding file has `n_rows` rows and,
+    when it carries a rows manifest, the row digest `digest`.
+    """
+    n = np.load(embeddings_path, mmap_mode="r").shape[0]
+    if n != n_rows:
+        raise ValueError(
+            f"{embeddings_path} has {n} rows but the corpus has {n_rows}; rebuild embeddings"
+        )
+    manifest = rows_manifest_path(embeddings_path)
+    if manifest.exists():
+        with manifest.open("r", encoding="utf-8") as f:
+            stored = json.load(f)["rows_digest"]
+        if stored != digest:
+            raise ValueError(
+                f"{embeddings_path} rows digest {stored[:12]} does not match "
+                f"corpus digest {digest[:12]}; rebuild embeddings"
+            )
+
+
+def main():
+    from scripts.retrieval import DATASET_PATH, EMBEDDINGS_PATH
+
+    parser = argparse.ArgumentParser(description="Compile the bayt dataset snapshot")
+    parser.add_argument("--dataset", type=Path, default=DATASET_PATH)
+    args = parser.parse_args()
+
+    out = compile_snapshot(args.dataset)
+    corpus = Corpus(out)
+    print(f"Compiled {len(corpus)} rows → {out} (digest {corpus.digest[:12]})")
+
+    if args.dataset == DATASET_PATH and EMBEDDINGS_PATH.exists():
+        corpus.check_alignment(EMBEDDINGS_PATH)
+        print(f"Aligned with {EMBEDDINGS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
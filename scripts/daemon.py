@@ -0,0 +1,160 @@
+# scripts/daemon.py
+# Long-running local fal server over a Unix socket
+#
+#   python -m scripts.daemon            # load everything once, then serve
+#   python -m scripts.cli "..."         # uses the daemon when one is running
+#
+# Protocol: one JSON object per line in each direction.
+#   → {"query": "..."}
+#   ← {"ok": true, "fal": "...", "poem_id": 1, "bayt_id": 3, "score": 0.71}
+#   ← {"ok": false, "error": "..."}
+
+import argparse
+import asyncio
+import json
+import signal
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from scripts.config import QUERY_EMBEDDER
+from scripts.daemon_client import CONNECT_TIMEOUT, SOCKET_PATH, request_fal  # noqa: F401
+from scripts.embedders import EMBEDDERS
+from scripts.fal_assembly import assemble_fal
+from scripts.language.affect_variants import AFFECT_VARIANTS
+from scripts.language.lens_hard import LENS_VARIANTS_HARD
+from scripts.language.lens_soft import LENS_VARIANTS_SOFT
+from scripts.retrieval import BaytRetriever, load_dataset, load_embeddings
+from scripts import tracing
+
+# scoring releases the GIL inside BLAS, so a few threads overlap well
+WORKERS = 4
+
+
+class FalService:
+    """Corpus, embeddings, retriever and embedder, loaded once per process."""
+
+    def __init__(
+        self,
+        embed: Callable[[str], np.ndarray],
+        embed_batch: Optional[Callable[[List[str]], np.ndarray]] = None,
+    ):
+        self.embed = embed
+        self.embed_batch = embed_batch
+        self.retriever = BaytRetriever(load_dataset(), load_embeddings())
+
+    def _reply(self, row, score: float) -> dict:
+        text = assemble_fal(
+            row,
+            affect_variants=AFFECT_VARIANTS,
+            lens_soft=LENS_VARIANTS_SOFT,
+            lens_hard=LENS_VARIANTS_HARD,
+        )
+        return {
+            "fal": text,
+            "poem_id": row["poem_id"],
+            "bayt_id": row["bayt_id"],
+            "score": float(score),
+        }
+
+    def fal(self, query: str) -> dict:
+        with tracing.request("fal"):
+            hit = self.retriever.search(self.embed(query), k=1)
+            return self._reply(hit.rows[0], hit.scores[0])
+
+    def fal_batch(self, queries: List[str]) -> List[dict]:
+        """One embedding call and one blocked GEMM for the whole batch."""
+        with tracing.request("fal_batch", size=len(queries)):
+            with tracing.span("embed_batch"):
+                if self.embed_batch is not None:
+                    embs = self.embed_batch(queries)
+                else:
+                    embs = np.stack([self.embed(q) for q in queries])
+            hits = self.retriever.search_batch(embs, k=1)
+            return [
+                self._reply(rows[0], scores[0])
+                for rows, scores in zip(hits.rows, hits.scores)
+            ]
+
+
+async def _handle(service: FalService, pool: ThreadPoolExecutor, reader, writer):
+    loop = asyncio.get_running_loop()
+    try:
+        while line := await reader.readline():
+            try:
+                query = json.loads(line)["query"]
+                result = await loop.run_in_executor(pool, service.fal, query)
+                reply = {"ok": True, **result}
+            except Exception as e:
+                reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            writer.write((json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8"))
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+def _daemon_running(path: Path) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(CONNECT_TIMEOUT)
+        try:
+            s.connect(str(path))
+            return True
+        except OSError:
+            return False
+
+
+async def serve(service: FalService, path: Path = SOCKET_PATH, workers: int = WORKERS):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        if _daemon_running(path):
+            raise RuntimeError(f"A daemon is already listening on {path}")
+        path.unlink()  # stale socket from a crashed daemon
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    server = await asyncio.start_unix_server(
+        lambda r, w: _handle(service, pool, r, w),
+        path=str(path),
+    )
+    print(f"[DAEMON] listening on {path}")
+
+    # stop cleanly on SIGTERM as well as Ctrl-C, so the socket is removed
+    stop = asyncio.get_running_loop().create_future()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set_result, None)
+    try:
+        async with server:
+            await stop
+    finally:
+        pool.shutdown(wait=False)
+        if path.exists():
+            path.unlink()
+
+
+def main():
+    from scripts.cli import embed_query, get_query_cache
+
+    parser = argparse.ArgumentParser(description="YaarAI fal daemon")
+    parser.add_argument("--socket", type=Path, default=SOCKET_PATH)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--embedder", choices=sorted(EMBEDDERS), default=QUERY_EMBEDDER)
+    parser.add_argument("--trace", type=Path, nargs="?", const=tracing.TRACE_DIR / "daemon.jsonl",
+                        help="Record per-stage spans (JSONL)")
+    args = parser.parse_args()
+
+    if args.trace:
+        tracing.enable(args.trace)
+
+    get_query_cache(args.embedder)
+    service = FalService(embed_query)
+    print(f"[DAEMON] loaded {len(service.retriever)} bayts")
+
+    try:
+        asyncio.run(serve(service, args.socket, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
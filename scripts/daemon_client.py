@@ -0,0 +1,51 @@
+# scripts/daemon_client.py
+# Client side of the fal daemon protocol (see scripts/daemon.py)
+#
+# Kept free of NumPy / retrieval imports so the CLI can ask a running
+# daemon without loading any of the in-process machinery.
+
+import json
+import socket
+from pathlib import Path
+from typing import Optional
+
+SOCKET_PATH = Path("data/run/yaarai.sock")
+CONNECT_TIMEOUT = 0.2
+
+
+def request_fal(query: str, path: Path = SOCKET_PATH, timeout: float = 30.0) -> Optional[dict]:
+    """
+    Send one query to a running daemon.
+    Returns None when no daemon is listening, or it goes away or times out
+    before replying, so callers can fall back to in-process retrieval.
+    Errors the daemon reports raise RuntimeError.
+    """
+    if not path.exists():
+        return None
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(CONNECT_TIMEOUT)
+        try:
+            s.connect(str(path))
+        except OSError:
+            return None
+
+        s.settimeout(timeout)
+        try:
+            s.sendall((json.dumps({"query": query}, ensure_ascii=False) + "\n").encode("utf-8"))
+            with s.makefile("rb") as f:
+                line = f.readline()
+        except OSError:  # includes the recv timeout and a reset connection
+            return None
+
+    # EOF or a torn line: the daemon crashed or restarted mid-request
+    if not line.endswith(b"\n"):
+        return None
+    try:
+        reply = json.loads(line)
+    except ValueError:
+        return None
+
+    if not reply.pop("ok"):
+        raise RuntimeError(f"daemon error: {reply['error']}")
+    return reply
@@ -0,0 +1,139 @@
+# scripts/disk_cache.py
+# Append-only key/value log with a sidecar offset index
+#
+#   <name>.log   one record per line: "<key>\t<value>\n"
+#   <name>.idx   one entry per line:  "<key>\t<offset>\t<length>\n"
+#   <name>.lock  flock'd by writers (several processes may share a log)
+#
+# Values are single-line strings (JSON, base64, ...). Records are never
+# rewritten; a later put() of the same key shadows the earlier one.
+# On open, records appended after the last indexed one (e.g. by a crash
+# between the two writes) are recovered by scanning the log tail, and a
+# torn final line is truncated. Both recovery and put() hold the
+# exclusive lock, so a tail being written by another process is never
+# mistaken for a torn one.
+
+import fcntl
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class AppendLog:
+    """
+    Persistent dict of str -> str.
+    get() costs one seek + read; opening costs one pass over the index.
+    Safe to share between threads of one process, and to write from
+    several processes (e.g. CLI and daemon); each process sees the
+    entries that existed when it opened the log plus its own.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.index_path = path.with_suffix(".idx")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._lockf = path.with_suffix(".lock").open("a")
+        with self._exclusive():
+            self._load()
+        self._log = self.path.open("ab")
+        self._reader = self.path.open("rb")
+        self._idx = self.index_path.open("a", encoding="utf-8")
+
+    @contextmanager
+    def _exclusive(self):
+        fcntl.flock(self._lockf, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lockf, fcntl.LOCK_UN)
+
+    def _load(self):
+        end = 0
+        if self.index_path.exists():
+            with self.index_path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) != 3:
+                        break  # torn index line; the log scan below recovers it
+                    key, offset, length = parts[0], int(parts[1]), int(parts[2])
+                    self._index[key] = (offset, length)
+                    end = max(end, offset + length)
+
+        if not self.path.exists():
+            return
+
+        size = self.path.stat().st_size
+        if end > size:
+            # index points past the log (log truncated by hand): rebuild
+            self._index.clear()
+            end = 0
+        if end == size:
+            return
+
+        recovered = []
+        with self.path.open("rb") as f:
+            f.seek(end)
+            offset = end
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                key = line.split(b"\t", 1)[0].decode("utf-8")
+                self._index[key] = (offset, len(line))
+                recovered.append((key, offset, len(line)))
+                offset += len(line)
+
+        if offset < size:
+            with self.path.open("r+b") as f:
+                f.truncate(offset)
+
+        # rewrite the index so it matches what survived
+        with self.index_path.open("w", encoding="utf-8") as f:
+            for key, (off, length) in self._index.items():
+                f.write(f"{key}\t{off}\t{length}\n")
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def keys(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def get(self, key: str) -> Optional[str]:
+        loc = self._index.get(key)
+        if loc is None:
+            return None
+        offset, length = loc
+        with self._lock:
+            self._reader.seek(offset)
+            line = self._reader.read(length)
+        return line.rstrip(b"\n").split(b"\t", 1)[1].decode("utf-8")
+
+    def put(self, key: str, value: str):
+        if "\t" in key or "\n" in key or "\n" in value:
+            raise ValueError("keys must not contain tabs/newlines; values must be one line")
+        record = f"{key}\t{value}\n".encode("utf-8")
+        with self._lock, self._exclusive():
+            self._log.seek(0, 2)
+            offset = self._log.tell()
+            self._log.write(record)
+            self._log.flush()
+            self._idx.write(f"{key}\t{offset}\t{len(record)}\n")
+            self._idx.flush()
+            self._index[key] = (offset, len(record))
+
+    def close(self):
+        self._log.close()
+        self._reader.close()
+        self._idx.close()
+        self._lockf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
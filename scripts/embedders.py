@@ -0,0 +1,146 @@
+# scripts/embedders.py
+# Pluggable text embedders with batched execution
+#
+#   embedder = get_embedder("hashing", dim=1024)
+#   vecs = embedder.embed(texts, batch_size=64, max_workers=4)
+#
+# Backends register themselves by name with @register_embedder. The same
+# backend (and parameters) must be used for bayts and for queries; its
+# `model_id` is what caches and manifests record.
+
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Type
+
+import numpy as np
+
+EMBEDDERS: Dict[str, Type["Embedder"]] = {}
+
+BATCH_SIZE = 64
+
+
+def register_embedder(name: str) -> Callable[[Type["Embedder"]], Type["Embedder"]]:
+    def wrap(cls):
+        cls.name = name
+        EMBEDDERS[name] = cls
+        return cls
+    return wrap
+
+
+def get_embedder(name: str, **kwargs) -> "Embedder":
+    try:
+        cls = EMBEDDERS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown embedder {name!r}; available: {sorted(EMBEDDERS)}"
+        ) from None
+    return cls(**kwargs)
+
+
+class Embedder:
+    """
+    Base class. Backends implement `embed_batch` for one batch of texts;
+    `embed` handles batching and optional thread-pool fan-out.
+    """
+
+    name = "base"
+    dim: int
+
+    @property
+    def model_id(self) -> str:
+        return self.name
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed(
+        self,
+        texts: Sequence[str],
+        *,
+        batch_size: int = BATCH_SIZE,
+        max_workers: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Embed `texts` in order, `batch_size` at a time.
+        With `max_workers` > 1, batches run concurrently on a thread pool
+        (useful for backends that wait on I/O or release the GIL).
+        """
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        if max_workers and max_workers > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                parts = list(pool.map(self.embed_batch, batches))
+        else:
+            parts = [self.embed_batch(b) for b in batches]
+
+        return np.vstack(parts).astype(np.float32, copy=False)
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed_batch([text])[0]
+
+
+@register_embedder("hashing")
+class HashingEmbedder(Embedder):
+    """
+    Offline, deterministic embedder: signed feature hashing of character
+    n-grams, L2-normalized. No model or network needed, so tests and
+    benchmarks can run the whole pipeline anywhere.
+    """
+
+    def __init__(self, dim: int = 1024, ngram_range: tuple = (2, 4)):
+        self.dim = dim
+        self.ngram_range = tuple(ngram_range)
+
+    @property
+    def model_id(self) -> str:
+        lo, hi = self.ngram_range
+        return f"hashing-d{self.dim}-n{lo}{hi}"
+
+    def _features(self, text: str) -> List[int]:
+        padded = f" {text} "
+        lo, hi = self.ngram_range
+        return [
+            zlib.crc32(padded[i:i + n].encode("utf-8"))
+            for n in range(lo, hi + 1)
+            for i in range(len(padded) - n + 1)
+        ]
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            h = np.array(self._features(text), dtype=np.uint32)
+            if h.size == 0:
+                continue
+            sign = np.where(h & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(out[row], h % self.dim, sign)
+
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+@register_embedder("openai")
+class OpenAIEmbedder(Embedder):
+    """OpenAI embeddings API; one request per batch."""
+
+    def __init__(self, model: str = "text-embedding-3-large", dim: int = 1024):
+        from openai import OpenAI
+
+        self.model = model
+        self.dim = dim
+        self.client = OpenAI()
+
+    @property
+    def model_id(self) -> str:
+        return f"openai-{self.model}-d{self.dim}"
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        resp = self.client.embeddings.create(
+            model=self.model,
+            input=texts,
+            dimensions=self.dim,
+        )
+        return np.array([d.embedding for d in resp.data], dtype=np.float32)
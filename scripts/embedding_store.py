@@ -0,0 +1,217 @@
+# scripts/embedding_store.py
+# Memory-mapped, optionally quantized bayt embedding store
+#
+# Layout (next to the float32 source file):
+#   bayts_embeddings.npy               float32 source (unchanged)
+#   bayts_embeddings.float32.npy       unit rows, float32
+#   bayts_embeddings.float16.npy       unit rows, float16
+#   bayts_embeddings.int8.npy          unit rows, int8 codes
+#   bayts_embeddings.int8.scales.npy   per-row float32 scale for the codes
+#
+# All files are plain .npy, opened with mmap_mode="r", so worker processes
+# on the same host share the page cache instead of each holding a copy.
+
+import argparse
+import numpy as np
+from pathlib import Path
+from typing import Optional, Tuple
+
+STORE_DTYPES = ("float32", "float16", "int8")
+
+# rows scored per block; bounds the float32 temporary for quantized codes
+BLOCK_ROWS = 512
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Return a float32 copy of `matrix` with every row scaled to unit length.
+    All-zero rows stay zero (they score 0 against any query).
+    """
+    m = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+def store_paths(source: Path, dtype: str) -> Tuple[Path, Optional[Path]]:
+    """Return (codes_path, scales_path) for a store derived from `source`."""
+    if dtype not in STORE_DTYPES:
+        raise ValueError(f"Unknown store dtype {dtype!r}; use one of {STORE_DTYPES}")
+    codes = source.with_name(f"{source.stem}.{dtype}.npy")
+    scales = source.with_name(f"{source.stem}.{dtype}.scales.npy")
+    return codes, scales if dtype == "int8" else None
+
+
+def quantize_int8(normed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric per-row int8 quantization.
+    Returns (codes, scales) with row ≈ codes * scale.
+    """
+    scales = np.abs(normed).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(normed / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def write_store(embeddings: np.ndarray, source: Path, dtype: str) -> Path:
+    """Write the unit-normalized `embeddings` in `dtype` next to `source`."""
+    codes_path, scales_path = store_paths(source, dtype)
+    normed = normalize_rows(embeddings)
+
+    if dtype == "int8":
+        codes, scales = quantize_int8(normed)
+        np.save(scales_path, scales)
+    else:
+        codes = normed.astype(dtype)
+
+    np.save(codes_path, codes)
+    return codes_path
+
+
+class EmbeddingStore:
+    """
+    Unit-normalized embedding rows, scored directly in storage precision.
+
+    `codes` holds float32/float16 unit rows or int8 codes (with `scales`).
+    If `source` is given (the float32 matrix, usually memory-mapped),
+    `rescore` can recompute exact float32 scores for a few candidates.
+    """
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        scales: Optional[np.ndarray] = None,
+        *,
+        source: Optional[np.ndarray] = None,
+    ):
+        if codes.dtype == np.int8 and scales is None:
+            raise ValueError("int8 codes require per-row scales")
+        self.codes = codes
+        self.scales = scales
+        self.source = source
+
+    @classmethod
+    def from_array(cls, embeddings: np.ndarray) -> "EmbeddingStore":
+        """In-memory float32 store; equivalent to the classic np.load path."""
+        return cls(normalize_rows(embeddings))
+
+    @classmethod
+    def open(
+        cls,
+        source: Path,
+        dtype: str = "int8",
+        *,
+        mmap: bool = True,
+        with_source: bool = True,
+    ) -> "EmbeddingStore":
+        """
+        Open a store written by `write_store`.
+        With `with_source`, the float32 file is also mapped for rescoring.
+        The raw source is never normalized in memory as a fallback: that
+        would give every process a private copy of the matrix.
+        """
+        mode = "r" if mmap else None
+        codes_path, scales_path = store_paths(source, dtype)
+
+        if not codes_path.exists():
+            raise FileNotFoundError(
+                f"Embedding store not found at {codes_path}. "
+                f"Run: python -m scripts.embedding_store --dtype {dtype}"
+            )
+
+        codes = np.load(codes_path, mmap_mode=mode)
+        scales = np.load(scales_path, mmap_mode=mode) if scales_path else None
+        src = None
+        if with_source and dtype != "float32" and source.exists():
+            src = np.load(source, mmap_mode=mode)
+        return cls(codes, scales, source=src)
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.codes.shape[1]
+
+    def _decode(self, codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+        block = codes.astype(np.float32, copy=False)
+        if scales is not None:
+            block = block * scales[:, None]
+        return block
+
+    def vectors(self, idx: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return float32 unit rows (dequantized) for `idx`, or all rows."""
+        if idx is None:
+            return self._decode(self.codes[:], self.scales)
+        idx = np.asarray(idx)
+        scales = self.scales[idx] if self.scales is not None else None
+        return self._decode(self.codes[idx], scales)
+
+    def scores(
+        self,
+        query_embedding: np.ndarray,
+        idx: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Cosine similarity of the query against all rows (or rows `idx`).
+        Quantized codes are scored block by block; no full float32 copy
+        of the matrix is ever materialized.
+        """
+        q = normalize_rows(query_embedding)
+        codes = self.codes if idx is None else self.codes[np.asarray(idx)]
+        scales = self.scales
+        if scales is not None and idx is not None:
+            scales = scales[np.asarray(idx)]
+
+        if codes.dtype == np.float32:
+            return codes @ q
+
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], BLOCK_ROWS):
+            stop = start + BLOCK_ROWS
+            out[start:stop] = codes[start:stop].astype(np.float32) @ q
+        if scales is not None:
+            out *= scales
+        return out
+
+    def scores_batch(self, queries: np.ndarray) -> np.ndarray:
+        """
+        (Q, n) cosine similarities for a (Q, d) query matrix, computed as
+        one matrix-matrix product (blockwise over rows for quantized codes).
+        """
+        q = normalize_rows(queries)
+        if self.codes.dtype == np.float32:
+            return q @ self.codes.T
+
+        out = np.empty((q.shape[0], self.codes.shape[0]), dtype=np.float32)
+        for start in range(0, self.codes.shape[0], BLOCK_ROWS):
+            stop = start + BLOCK_ROWS
+            out[:, start:stop] = q @ self.codes[start:stop].astype(np.float32).T
+        if self.scales is not None:
+            out *= self.scales
+        return out
+
+    def rescore(self, idx: np.ndarray, query_embedding: np.ndarray) -> np.ndarray:
+        """Exact float32 scores for candidate rows `idx`."""
+        if self.source is None:
+            return self.scores(query_embedding, idx)
+        rows = normalize_rows(self.source[np.asarray(idx)])
+        return rows @ normalize_rows(query_embedding)
+
+
+def main():
+    from scripts.retrieval import EMBEDDINGS_PATH
+
+    parser = argparse.ArgumentParser(description="Write a memory-mappable embedding store")
+    parser.add_argument("--dtype", choices=STORE_DTYPES, default="int8")
+    parser.add_argument("--source", type=Path, default=EMBEDDINGS_PATH)
+    args = parser.parse_args()
+
+    embeddings = np.load(args.source, mmap_mode="r")
+    out = write_store(embeddings, args.source, args.dtype)
+
+    print(f"Wrote {len(embeddings)} rows ({args.dtype}) → {out}")
+
+
+if __name__ == "__main__":
+    main()
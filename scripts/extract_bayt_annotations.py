@@ -1,21 +1,32 @@
 # scripts/extract_bayt_annotations.py
 # Extract bayt-level semantic annotations (v1.0)
 # Rate-limit safe + resume-safe + strict affect validation with rejection logging
+# Rejected affects: local fuzzy mapping first, then one corrective re-ask
 
+import argparse
+import asyncio
+import difflib
 import json
-import time
 from pathlib import Path
 from datetime import datetime
+from typing import Optional, Sequence, Tuple
 
-from openai import OpenAI, RateLimitError
+from scripts.annotation_runner import RateLimiter, RetryPolicy, add_runner_args, from_args, run_ordered
+from scripts.checkpoint import Checkpoint
+from scripts.llm import cache_stats, chat
 
 from prompts.prompts_v1 import (
     SYSTEM_PROMPT,
     BAYT_PROMPT,
     PROMPT_VERSION,
 )
+from prompts.corrective_prompts_v1 import AFFECT_CORRECTION_PROMPT
+from prompts.packed_prompts_v1 import PACKED_BAYT_ITEM, PACKED_BAYT_PROMPT
 
 MODEL_NAME = "gpt-4.1"
+PACK_SIZE = 1  # bayts per request; >1 uses the packed prompt
+JSON_MODES = ("schema", "object", "off")
+JSON_MODE = "schema"
 
 AFFECT_VOCAB = [
     "اندوه",
@@ -28,6 +39,25 @@ AFFECT_VOCAB = [
     "بی‌قراری",
 ]
 
+# near-miss labels the model tends to use instead of AFFECT_VOCAB
+AFFECT_SYNONYMS = {
+    "غم": "اندوه",
+    "حزن": "اندوه",
+    "اندوهگینی": "اندوه",
+    "امیدواری": "امید",
+    "نومیدی": "ناامیدی",
+    "یأس": "ناامیدی",
+    "تحیر": "حیرت",
+    "شگفتی": "حیرت",
+    "اشتیاق": "شوق",
+    "افسوس": "حسرت",
+    "آسودگی": "آرامش",
+    "سکون": "آرامش",
+    "ناآرامی": "بی‌قراری",
+    "اضطراب": "بی‌قراری",
+}
+FUZZY_CUTOFF = 0.8
+
 RAW_PATH = Path("data/raw/ghazals_with_insight.jsonl")
 AXIS_PATH = Path("data/annotations/ghazal_axis_v1.jsonl")
 OUT_PATH = Path("data/annotations/bayt_annotations_v1.jsonl")
@@ -38,8 +68,6 @@ REJECT_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-client = OpenAI()
-
 
 def load_axis_map() -> dict:
     """Map poem_id -> ghazal_axis"""
@@ -51,43 +79,76 @@ def load_axis_map() -> dict:
     return axis_map
 
 
-def load_done_keys() -> set[tuple]:
-    """Return (poem_id, bayt_id) already processed."""
-    if not OUT_PATH.exists():
-        return set()
-    done = set()
-    with OUT_PATH.open("r", encoding="utf-8") as f:
-        for line in f:
-            r = json.loads(line)
-            done.add((r["poem_id"], r["bayt_id"]))
-    return done
-
-
-def call_gpt_with_backoff(prompt: str) -> dict:
-    """Call GPT-4.1 and return parsed JSON with retry on rate limit."""
-    while True:
-        try:
-            response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.0,
-                top_p=1.0,
-                seed=42,
-            )
-            content = response.choices[0].message.content
-            return json.loads(content)
+def response_format(json_mode: str, packed: bool = False) -> Optional[dict]:
+    """
+    `response_format` for a (packed) bayt request: a strict JSON schema
+    whose affect items are restricted to AFFECT_VOCAB, plain JSON mode,
+    or None.
+    """
+    if json_mode == "off":
+        return None
+    if json_mode == "object":
+        return {"type": "json_object"}
+
+    item = {
+        "type": "object",
+        "properties": {
+            "bayt_hint": {"type": "string"},
+            "affect": {"type": "array", "items": {"type": "string", "enum": AFFECT_VOCAB}},
+        },
+        "required": ["bayt_hint", "affect"],
+        "additionalProperties": False,
+    }
+    if packed:
+        item["properties"] = {"bayt_id": {"type": "integer"}, **item["properties"]}
+        item["required"] = ["bayt_id", *item["required"]]
+        schema = {
+            "type": "object",
+            "properties": {"bayts": {"type": "array", "items": item}},
+            "required": ["bayts"],
+            "additionalProperties": False,
+        }
+    else:
+        schema = item
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "bayt_annotations" if packed else "bayt_annotation",
+            "strict": True,
+            "schema": schema,
+        },
+    }
 
-        except RateLimitError:
-            wait_time = 1.0
-            print(f"[RATE LIMIT] sleeping {wait_time}s...")
-            time.sleep(wait_time)
 
-        except json.JSONDecodeError:
-            print("[WARN] Invalid JSON, retrying...")
-            time.sleep(0.5)
+async def call_gpt_with_backoff(
+    prompt: str,
+    limiter: RateLimiter,
+    retry: RetryPolicy,
+    label: str = "",
+    history: Sequence[dict] = (),
+    json_mode: str = JSON_MODE,
+    packed: bool = False,
+) -> dict:
+    """
+    Call GPT-4.1 and return parsed JSON.
+    Rate limits, server errors and invalid JSON are retried per `retry`
+    (bounded by its attempts and elapsed time).
+    """
+    async def attempt() -> dict:
+        return await chat(
+            SYSTEM_PROMPT,
+            prompt,
+            model=MODEL_NAME,
+            limiter=limiter,
+            temperature=0.0,
+            top_p=1.0,
+            seed=42,
+            parse=json.loads,
+            response_format=response_format(json_mode, packed),
+            history=history,
+        )
+
+    return await retry.call(attempt, label=label)
 
 
 def validate_annotation(obj: dict):
@@ -102,107 +163,358 @@ def validate_annotation(obj: dict):
         assert a in AFFECT_VOCAB
 
 
-def call_gpt_until_valid(prompt: str, meta: dict, max_attempts: int = 2) -> dict:
-    """
-    Call GPT up to `max_attempts`.
-    If affect is invalid after final attempt, return blank affect [].
-    All rejections are logged.
-    """
-    attempt = 0
+def _label_form(label: str) -> str:
+    """Spelling-insensitive form: Arabic yeh/kaf, spaces and ZWNJ unified."""
+    return (
+        label.strip()
+        .replace("ي", "ی")
+        .replace("ك", "ک")
+        .replace("\u200c", "")
+        .replace(" ", "")
+    )
 
-    while attempt < max_attempts:
-        attempt += 1
-        annotation = call_gpt_with_backoff(prompt)
 
-        try:
-            validate_annotation(annotation)
-            return annotation
+_AFFECT_FORMS = {
+    **{_label_form(k): v for k, v in AFFECT_SYNONYMS.items()},
+    **{_label_form(v): v for v in AFFECT_VOCAB},
+}
 
-        except AssertionError:
+
+def map_affect(label) -> Optional[str]:
+    """The AFFECT_VOCAB entry `label` is a near miss of, if any."""
+    if not isinstance(label, str):
+        return None
+    form = _label_form(label)
+    if form in _AFFECT_FORMS:
+        return _AFFECT_FORMS[form]
+    close = difflib.get_close_matches(form, list(_AFFECT_FORMS), n=1, cutoff=FUZZY_CUTOFF)
+    return _AFFECT_FORMS[close[0]] if close else None
+
+
+def fuzzy_fix(annotation) -> Optional[dict]:
+    """
+    `annotation` with its affect labels mapped onto AFFECT_VOCAB, or None
+    when the shape is wrong or some label has no close match.
+    """
+    if not isinstance(annotation, dict) or not isinstance(annotation.get("affect"), list):
+        return None
+    mapped = []
+    for label in annotation["affect"]:
+        affect = map_affect(label)
+        if affect is None:
+            return None
+        if affect not in mapped:
+            mapped.append(affect)
+    fixed = {**annotation, "affect": mapped}
+    try:
+        validate_annotation(fixed)
+    except AssertionError:
+        return None
+    return fixed
+
+
+def _returned_affect(annotation):
+    return annotation.get("affect") if isinstance(annotation, dict) else annotation
+
+
+def _rejected_labels(annotation) -> list:
+    affect = _returned_affect(annotation)
+    if not isinstance(affect, list):
+        return [affect]
+    return [a for a in affect if a not in AFFECT_VOCAB] or affect
+
+
+def log_rejections(meta: dict, rejections: list, resolved_by: str, affect: list):
+    """
+    Append one record per rejected answer for a bayt, all marked with the
+    strategy that finally resolved it: fuzzy (mapped locally), corrective
+    (re-asked with the rejected labels), unpack (packed item re-asked
+    alone) or blank.
+    """
+    with REJECT_LOG_PATH.open("a", encoding="utf-8") as f:
+        for i, (attempt, annotation) in enumerate(rejections, 1):
             rejected = {
                 "timestamp": datetime.utcnow().isoformat(),
                 "poem_id": meta["poem_id"],
                 "bayt_id": meta["bayt_id"],
                 "attempt": attempt,
-                "returned_affect": annotation.get("affect"),
+                "returned_affect": _returned_affect(annotation),
                 "allowed_affect_vocab": AFFECT_VOCAB,
                 "model": MODEL_NAME,
                 "prompt_version": PROMPT_VERSION,
-                "final": attempt == max_attempts,
+                "final": i == len(rejections),
+                "resolved_by": resolved_by,
+                "resolved_affect": affect,
             }
+            f.write(json.dumps(rejected, ensure_ascii=False) + "\n")
 
-            with REJECT_LOG_PATH.open("a", encoding="utf-8") as f:
-                f.write(json.dumps(rejected, ensure_ascii=False) + "\n")
 
-            print(
-                f"[REJECT] poem_id={meta['poem_id']} "
-                f"bayt_id={meta['bayt_id']} "
-                f"attempt={attempt} "
-                f"affect={annotation.get('affect')}"
-            )
+async def call_gpt_until_valid(
+    prompt: str,
+    meta: dict,
+    limiter: RateLimiter,
+    retry: RetryPolicy,
+    max_attempts: int = 2,
+    json_mode: str = JSON_MODE,
+) -> Tuple[dict, Optional[str]]:
+    """
+    Call GPT up to `max_attempts`.
+    A rejected answer is first mapped onto AFFECT_VOCAB locally
+    (fuzzy_fix); only when that fails is GPT asked again, with its
+    rejected labels and the allowed vocabulary fed back.
+    If affect is invalid after final attempt, return blank affect [].
+    All rejections are logged with the strategy that resolved them.
+    Returns (annotation, strategy), strategy None when the first answer
+    was valid, else "fuzzy", "corrective" or "blank".
+    """
+    label = f"poem_id={meta['poem_id']} bayt_id={meta['bayt_id']}"
+    rejections = []
+    history = []
 
-            time.sleep(0.3)
+    for attempt in range(1, max_attempts + 1):
+        annotation = await call_gpt_with_backoff(
+            prompt, limiter, retry, label=label, history=history, json_mode=json_mode,
+        )
+
+        try:
+            validate_annotation(annotation)
+        except AssertionError:
+            rejections.append((attempt, annotation))
+            print(f"[REJECT] {label} attempt={attempt} affect={_returned_affect(annotation)}")
+
+            fixed = fuzzy_fix(annotation)
+            if fixed is not None:
+                print(f"[FUZZY] {label} affect={fixed['affect']}")
+                log_rejections(meta, rejections, "fuzzy", fixed["affect"])
+                return fixed, "fuzzy"
+
+            # the same prompt at temperature 0 would return the same answer
+            history = [
+                {"role": "assistant", "content": json.dumps(annotation, ensure_ascii=False)},
+                {"role": "user", "content": AFFECT_CORRECTION_PROMPT.format(
+                    rejected="، ".join(map(str, _rejected_labels(annotation))),
+                    affect_list="، ".join(AFFECT_VOCAB),
+                )},
+            ]
+            continue
+
+        if rejections:
+            log_rejections(meta, rejections, "corrective", annotation["affect"])
+            return annotation, "corrective"
+        return annotation, None
 
     # ⬇️ Final fallback after max_attempts
     print(
         f"[BLANK] poem_id={meta['poem_id']} "
         f"bayt_id={meta['bayt_id']} affect=[]"
     )
+    log_rejections(meta, rejections, "blank", [])
 
+    hint = annotation.get("bayt_hint") if isinstance(annotation, dict) else None
     return {
-        "bayt_hint": annotation.get("bayt_hint", "").strip(),
+        "bayt_hint": hint.strip() if isinstance(hint, str) else "",
         "affect": [],
+    }, "blank"
+
+
+def make_record(
+    row: dict,
+    annotation: dict,
+    ghazal_axis: str,
+    *,
+    json_mode: str = JSON_MODE,
+    pack_size: int = 1,
+    affect_fix: Optional[str] = None,
+) -> dict:
+    """
+    The v1 output record for one raw bayt. annotation_meta records how it
+    was requested (json_mode, bayts in the request) and, if the model's
+    affect was rejected, how that was resolved (affect_fix).
+    """
+    meta = {
+        "model": MODEL_NAME,
+        "prompt_version": PROMPT_VERSION,
+        "json_mode": json_mode,
+        "pack_size": pack_size,
+    }
+    if affect_fix is not None:
+        meta["affect_fix"] = affect_fix
+    return {
+        "poem_id": row["poem_id"],
+        "bayt_id": row["bayt_id"],
+        "bayt_hint": annotation["bayt_hint"],
+        "affect": annotation["affect"],
+        "ghazal_axis": ghazal_axis,
+        "annotation_meta": meta,
     }
 
 
+async def annotate_bayt(
+    row: dict,
+    ghazal_axis: str,
+    limiter: RateLimiter,
+    retry: RetryPolicy,
+    json_mode: str = JSON_MODE,
+) -> dict:
+    """Annotate one raw bayt; returns its v1 record."""
+    prompt = BAYT_PROMPT.format(
+        affect_list="، ".join(AFFECT_VOCAB),
+        ghazal_axis=ghazal_axis,
+        bayt_text=row["text"],
+        bayt_prose=row["insight"]["bayt_summary"],
+    )
+    annotation, affect_fix = await call_gpt_until_valid(
+        prompt,
+        meta={
+            "poem_id": row["poem_id"],
+            "bayt_id": row["bayt_id"],
+        },
+        limiter=limiter,
+        retry=retry,
+        json_mode=json_mode,
+    )
+    return make_record(row, annotation, ghazal_axis, json_mode=json_mode, affect_fix=affect_fix)
 
-def main():
-    axis_map = load_axis_map()
-    done = load_done_keys()
-
-    with RAW_PATH.open("r", encoding="utf-8") as fin, \
-         OUT_PATH.open("a", encoding="utf-8") as fout:
 
-        for line in fin:
-            row = json.loads(line)
-            key = (row["poem_id"], row["bayt_id"])
+def iter_packs(rows, pack_size: int):
+    """
+    Consecutive (row, input offset) items grouped into packs of up to
+    `pack_size` bayts of the same ghazal.
+    """
+    pack = []
+    for row, end in rows:
+        if pack and (len(pack) == pack_size or pack[0][0]["poem_id"] != row["poem_id"]):
+            yield pack
+            pack = []
+        pack.append((row, end))
+    if pack:
+        yield pack
 
-            if key in done:
-                continue
 
-            prompt = BAYT_PROMPT.format(
-                affect_list="، ".join(AFFECT_VOCAB),
-                ghazal_axis=axis_map[row["poem_id"]],
+def _pack_items(annotations, rows: list) -> list:
+    """
+    Items of a packed reply ({"bayts": [...]}, or a bare JSON array)
+    matched to `rows` by bayt_id, or by position when the reply has no
+    ids but the right length. Unmatched rows get None.
+    """
+    if isinstance(annotations, dict):
+        annotations = next((v for v in annotations.values() if isinstance(v, list)), [])
+    if not isinstance(annotations, list):
+        return [None] * len(rows)
+
+    by_id = {
+        str(a["bayt_id"]): a
+        for a in annotations
+        if isinstance(a, dict) and "bayt_id" in a
+    }
+    if not by_id and len(annotations) == len(rows):
+        return annotations
+    return [by_id.get(str(row["bayt_id"])) for row in rows]
+
+
+async def annotate_pack(
+    rows: list,
+    ghazal_axis: str,
+    limiter: RateLimiter,
+    retry: RetryPolicy,
+    json_mode: str = JSON_MODE,
+) -> list:
+    """
+    Annotate bayts of one ghazal in a single request. Each returned item
+    is checked with validate_annotation; invalid items are mapped locally
+    (fuzzy_fix) when possible, otherwise — like missing ones — re-requested
+    individually (annotate_bayt). Returns the v1 records in `rows` order.
+    """
+    if len(rows) == 1:
+        return [await annotate_bayt(rows[0], ghazal_axis, limiter, retry, json_mode)]
+
+    prompt = PACKED_BAYT_PROMPT.format(
+        affect_list="، ".join(AFFECT_VOCAB),
+        ghazal_axis=ghazal_axis,
+        bayts="\n".join(
+            PACKED_BAYT_ITEM.format(
+                bayt_id=row["bayt_id"],
                 bayt_text=row["text"],
                 bayt_prose=row["insight"]["bayt_summary"],
             )
+            for row in rows
+        ),
+    )
+    first, last = rows[0], rows[-1]
+    try:
+        items = _pack_items(await call_gpt_with_backoff(
+            prompt, limiter, retry,
+            label=f"poem_id={first['poem_id']} bayt_id={first['bayt_id']}..{last['bayt_id']}",
+            json_mode=json_mode,
+            packed=True,
+        ), rows)
+    except json.JSONDecodeError:
+        items = [None] * len(rows)
+
+    records = []
+    for row, item in zip(rows, items):
+        try:
+            validate_annotation(item)
+            records.append(make_record(row, item, ghazal_axis, json_mode=json_mode, pack_size=len(rows)))
+            continue
+        except AssertionError:
+            pass
 
-            annotation = call_gpt_until_valid(
-                prompt,
-                meta={
-                    "poem_id": row["poem_id"],
-                    "bayt_id": row["bayt_id"],
-                },
-            )
+        fixed = fuzzy_fix(item)
+        if fixed is not None:
+            print(f"[FUZZY] poem_id={row['poem_id']} bayt_id={row['bayt_id']} affect={fixed['affect']}")
+            log_rejections(row, [(0, item)], "fuzzy", fixed["affect"])
+            records.append(make_record(
+                row, fixed, ghazal_axis, json_mode=json_mode, pack_size=len(rows), affect_fix="fuzzy",
+            ))
+            continue
+
+        print(f"[UNPACK] poem_id={row['poem_id']} bayt_id={row['bayt_id']} → single request")
+        record = await annotate_bayt(row, ghazal_axis, limiter, retry, json_mode)
+        if item is not None:
+            log_rejections(row, [(0, item)], "unpack", record["affect"])
+        records.append(record)
+    return records
 
-            record = {
-                "poem_id": row["poem_id"],
-                "bayt_id": row["bayt_id"],
-                "bayt_hint": annotation["bayt_hint"],
-                "affect": annotation["affect"],
-                "ghazal_axis": axis_map[row["poem_id"]],
-                "annotation_meta": {
-                    "model": MODEL_NAME,
-                    "prompt_version": PROMPT_VERSION,
-                },
-            }
 
-            fout.write(json.dumps(record, ensure_ascii=False) + "\n")
+def main():
+    parser = argparse.ArgumentParser(description="Extract bayt-level annotations (v1.0)")
+    add_runner_args(parser)
+    parser.add_argument("--pack-size", type=int, default=PACK_SIZE,
+                        help="Bayts of the same ghazal per request (1 = one request per bayt)")
+    parser.add_argument("--json-mode", choices=JSON_MODES, default=JSON_MODE,
+                        help="Constrain replies: strict JSON schema, plain JSON mode, or off")
+    args = parser.parse_args()
+    if args.pack_size < 1:
+        parser.error("--pack-size must be at least 1")
+
+    axis_map = load_axis_map()
+    limiter, gate, retry = from_args(args)
+    ckpt = Checkpoint(RAW_PATH, OUT_PATH)
+
+    def pending():
+        rows = ((row, end) for row, end in ckpt.lines() if not ckpt.is_done(row))
+        return iter_packs(rows, args.pack_size)
+
+    async def annotate(pack: list) -> list:
+        rows = [row for row, _ in pack]
+        return await annotate_pack(rows, axis_map[rows[0]["poem_id"]], limiter, retry, args.json_mode)
+
+    with ckpt:
+        fout = ckpt.open_output()
+
+        def write(pack: list, records: list):
+            for record in records:
+                fout.write(json.dumps(record, ensure_ascii=False) + "\n")
             fout.flush()
+            ckpt.advance([row for row, _ in pack], pack[-1][1])
+
+            for row, _ in pack:
+                print(f"[OK] poem_id={row['poem_id']} bayt_id={row['bayt_id']}")
 
-            print(f"[OK] poem_id={row['poem_id']} bayt_id={row['bayt_id']}")
+        asyncio.run(run_ordered(pending(), annotate, write, concurrency=gate))
 
-            time.sleep(0.25)
+    print(f"[CACHE] {cache_stats['hits']} hits, {cache_stats['misses']} misses")
 
 
 if __name__ == "__main__":
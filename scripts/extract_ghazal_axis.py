@@ -2,12 +2,14 @@
 # Extract ghazal-level semantic axis (v1.0)
 # Rate-limit safe
 
+import argparse
+import asyncio
 import json
-import time
-from collections import defaultdict
 from pathlib import Path
 
-from openai import OpenAI, RateLimitError
+from scripts.annotation_runner import RateLimiter, RetryPolicy, add_runner_args, from_args, run_ordered
+from scripts.checkpoint import Checkpoint, poem_key
+from scripts.llm import cache_stats, chat
 
 from prompts.prompts_v1 import (
     SYSTEM_PROMPT,
@@ -21,70 +23,84 @@ RAW_PATH = Path("data/raw/ghazals_with_insight.jsonl")
 OUT_PATH = Path("data/annotations/ghazal_axis_v1.jsonl")
 OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-client = OpenAI()
 
-
-def load_existing_poem_ids(path: Path) -> set[int]:
-    """Return poem_ids already processed (resume-safe)."""
-    if not path.exists():
-        return set()
-    with path.open("r", encoding="utf-8") as f:
-        return {json.loads(line)["poem_id"] for line in f}
-
-
-def load_raw_data() -> list[dict]:
-    with RAW_PATH.open("r", encoding="utf-8") as f:
-        return [json.loads(line) for line in f]
-
-
-def call_gpt_with_backoff(prompt: str) -> str:
-    """Call GPT-4.1 with simple rate-limit backoff."""
-    while True:
-        try:
-            response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.0,
-                top_p=1.0,
-                seed=42,
-            )
-            return response.choices[0].message.content.strip()
-
-        except RateLimitError:
-            wait_time = 1.0
-            print(f"[RATE LIMIT] sleeping {wait_time}s...")
-            time.sleep(wait_time)
+def iter_poems(ckpt: Checkpoint):
+    """
+    (poem_id, bayts, input offset past the poem's last bayt) for each
+    ghazal, from the checkpointed offset on. RAW_PATH lists the bayts of
+    a ghazal contiguously.
+    """
+    poem_id, bayts, end = None, [], 0
+    seen = set()
+    for row, offset in ckpt.lines():
+        if row["poem_id"] != poem_id:
+            if bayts:
+                yield poem_id, bayts, end
+            poem_id, bayts = row["poem_id"], []
+            if poem_id in seen:
+                raise ValueError(f"{RAW_PATH}: bayts of poem_id={poem_id} are not contiguous")
+            seen.add(poem_id)
+        bayts.append(row)
+        end = offset
+    if bayts:
+        yield poem_id, bayts, end
+
+
+async def call_gpt_with_backoff(
+    prompt: str,
+    limiter: RateLimiter,
+    retry: RetryPolicy,
+    label: str = "",
+) -> str:
+    """Call GPT-4.1; rate limits and server errors are retried per `retry`."""
+    async def attempt() -> str:
+        content = await chat(
+            SYSTEM_PROMPT,
+            prompt,
+            model=MODEL_NAME,
+            limiter=limiter,
+            temperature=0.0,
+            top_p=1.0,
+            seed=42,
+        )
+        return content.strip()
+
+    return await retry.call(attempt, label=label)
 
 
 def main():
-    rows = load_raw_data()
-    done_poems = load_existing_poem_ids(OUT_PATH)
+    parser = argparse.ArgumentParser(description="Extract ghazal-level axes (v1.0)")
+    add_runner_args(parser)
+    args = parser.parse_args()
 
-    poems = defaultdict(list)
-    for r in rows:
-        poems[r["poem_id"]].append(r)
+    limiter, gate, retry = from_args(args)
+    ckpt = Checkpoint(RAW_PATH, OUT_PATH, poem_key)
 
-    with OUT_PATH.open("a", encoding="utf-8") as out:
-        for poem_id, bayts in poems.items():
-            if poem_id in done_poems:
-                continue
+    pending = (
+        poem for poem in iter_poems(ckpt)
+        if not ckpt.is_done(poem[1][0])
+    )
 
-            all_bayts_text = "\n".join(
-                f"- {b['text']}" for b in bayts
-            )
+    async def extract(poem: tuple) -> str:
+        poem_id, bayts, _ = poem
+        all_bayts_text = "\n".join(
+            f"- {b['text']}" for b in bayts
+        )
 
-            ghazal_prose = bayts[0]["insight"]["ghazal_summary"]
+        ghazal_prose = bayts[0]["insight"]["ghazal_summary"]
 
-            prompt = GHAZAL_AXIS_PROMPT.format(
-                all_bayts=all_bayts_text,
-                ghazal_prose=ghazal_prose,
-            )
+        prompt = GHAZAL_AXIS_PROMPT.format(
+            all_bayts=all_bayts_text,
+            ghazal_prose=ghazal_prose,
+        )
 
-            axis = call_gpt_with_backoff(prompt)
+        return await call_gpt_with_backoff(prompt, limiter, retry, label=f"poem_id={poem_id}")
 
+    with ckpt:
+        out = ckpt.open_output()
+
+        def write(poem: tuple, axis: str):
+            poem_id, bayts, end = poem
             record = {
                 "poem_id": poem_id,
                 "ghazal_axis": axis,
@@ -96,11 +112,13 @@ def main():
 
             out.write(json.dumps(record, ensure_ascii=False) + "\n")
             out.flush()
+            ckpt.advance(bayts[:1], end)
 
             print(f"[OK] poem_id={poem_id} → {axis}")
 
-            # gentle smoothing to stay under TPM
-            time.sleep(0.2)
+        asyncio.run(run_ordered(pending, extract, write, concurrency=gate))
+
+    print(f"[CACHE] {cache_stats['hits']} hits, {cache_stats['misses']} misses")
 
 
 if __name__ == "__main__":
@@ -5,6 +5,7 @@ from typing import Optional
 
 from .types import BaytRow
 from .config import SOFT_LENSES, HARD_LENSES, DEFAULT_MARKER
+from .tracing import traced
 
 
 def choose_variant(options):
@@ -39,6 +40,7 @@ def render_lens_block(
     return None
 
 
+@traced()
 def assemble_fal(
     row: BaytRow,
     *,
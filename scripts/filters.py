@@ -0,0 +1,125 @@
+# scripts/filters.py
+# Metadata filters for retrieval (affect / lens / ghazal_axis)
+#
+# Affect and ghazal_axis act as constraints during retrieval
+# (see docs/design-decisions.md). A MetadataIndex precomputes one boolean
+# mask per label over row positions; filters combine those masks, and the
+# retriever scores only the rows that survive.
+#
+#   where = affect_contains("حسرت") & lens_in(SOFT_LENSES)
+#   retriever.search(q, k=5, where=where)
+
+import numpy as np
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+from scripts.types import BaytRow
+
+
+def _masks(n: int, positions: Dict) -> Dict[object, np.ndarray]:
+    masks = {}
+    for label, idx in positions.items():
+        m = np.zeros(n, dtype=bool)
+        m[idx] = True
+        masks[label] = m
+    return masks
+
+
+class MetadataIndex:
+    """Per-label boolean masks over row positions."""
+
+    def __init__(
+        self,
+        n: int,
+        affect: Dict[str, np.ndarray],
+        lens: Dict[Optional[str], np.ndarray],
+        ghazal_axis: Dict[str, np.ndarray],
+    ):
+        self.n = n
+        self.affect = affect
+        self.lens = lens
+        self.ghazal_axis = ghazal_axis
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[BaytRow]) -> "MetadataIndex":
+        n = len(rows)
+        affect = defaultdict(list)
+        lens = defaultdict(list)
+        axis = defaultdict(list)
+        for i, r in enumerate(rows):
+            for a in r.get("affect") or []:
+                affect[a].append(i)
+            lens[r.get("lens")].append(i)
+            if r.get("ghazal_axis") is not None:
+                axis[r["ghazal_axis"]].append(i)
+
+        return cls(n, _masks(n, affect), _masks(n, lens), _masks(n, axis))
+
+    def any_of(self, field: Dict, labels: Iterable) -> np.ndarray:
+        """OR of the masks for `labels`; unknown labels match nothing."""
+        out = np.zeros(self.n, dtype=bool)
+        for label in labels:
+            m = field.get(label)
+            if m is not None:
+                out |= m
+        return out
+
+    def mask(self, where: "Where") -> np.ndarray:
+        return where.evaluate(self)
+
+
+class Where:
+    """
+    A composable row predicate evaluated against a MetadataIndex.
+    Combine with `&`, `|` and `~`.
+    """
+
+    def __init__(self, fn: Callable[[MetadataIndex], np.ndarray], label: str):
+        self._fn = fn
+        self.label = label
+
+    def evaluate(self, index: MetadataIndex) -> np.ndarray:
+        return self._fn(index)
+
+    def __and__(self, other: "Where") -> "Where":
+        return Where(
+            lambda ix: self.evaluate(ix) & other.evaluate(ix),
+            f"({self.label} and {other.label})",
+        )
+
+    def __or__(self, other: "Where") -> "Where":
+        return Where(
+            lambda ix: self.evaluate(ix) | other.evaluate(ix),
+            f"({self.label} or {other.label})",
+        )
+
+    def __invert__(self) -> "Where":
+        return Where(lambda ix: ~self.evaluate(ix), f"not {self.label}")
+
+    def __repr__(self) -> str:
+        return f"Where({self.label})"
+
+
+def affect_contains(*labels: str) -> Where:
+    """Rows whose affect list contains any of `labels`."""
+    return Where(
+        lambda ix: ix.any_of(ix.affect, labels),
+        f"affect contains {'|'.join(labels)}",
+    )
+
+
+def lens_in(labels: Iterable[Optional[str]]) -> Where:
+    """Rows whose lens is one of `labels` (None matches rows without a lens)."""
+    labels = list(labels)
+    return Where(
+        lambda ix: ix.any_of(ix.lens, labels),
+        f"lens in {sorted(map(str, labels))}",
+    )
+
+
+def ghazal_axis_is(*axes: str) -> Where:
+    """Rows belonging to a ghazal with one of the given axes."""
+    return Where(
+        lambda ix: ix.any_of(ix.ghazal_axis, axes),
+        f"ghazal_axis = {'|'.join(axes)}",
+    )
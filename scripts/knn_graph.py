@@ -0,0 +1,122 @@
+# scripts/knn_graph.py
+# Precomputed bayt-to-bayt k-nearest-neighbour graph
+#
+#   python -m scripts.knn_graph --k 32
+#
+# writes next to the embeddings:
+#   bayts_embeddings.knn.ids.npy      (n, k) int32 neighbour rows, best first
+#   bayts_embeddings.knn.scores.npy   (n, k) float16 cosine similarities
+#
+# "Bayts resonant with this bayt" is then a row lookup instead of a scan.
+
+import argparse
+import time
+import numpy as np
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+from scripts.embedding_store import EmbeddingStore
+from scripts.retrieval import EMBEDDINGS_PATH, TopK, top_k_rows
+from scripts.types import BaytRow
+
+KNN_K = 32
+BLOCK_SIZE = 512
+
+
+def graph_paths(source: Path = EMBEDDINGS_PATH) -> Tuple[Path, Path]:
+    return (
+        source.with_name(f"{source.stem}.knn.ids.npy"),
+        source.with_name(f"{source.stem}.knn.scores.npy"),
+    )
+
+
+def build_knn_graph(
+    embeddings: np.ndarray,
+    k: int = KNN_K,
+    *,
+    block_size: int = BLOCK_SIZE,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k neighbours of every row (excluding itself).
+    Rows are scored `block_size` at a time against the full matrix, so
+    scratch memory stays at block_size × n floats.
+    """
+    store = embeddings if isinstance(embeddings, EmbeddingStore) \
+        else EmbeddingStore.from_array(embeddings)
+    n = len(store)
+    k = min(k, n - 1)
+
+    ids = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float16)
+
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = store.scores_batch(store.vectors(np.arange(start, stop)))
+        block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        best = top_k_rows(block, k)
+        ids[start:stop] = best
+        scores[start:stop] = np.take_along_axis(block, best, axis=1)
+
+    return ids, scores
+
+
+class KnnGraph:
+    """Memory-mapped neighbour lists; lookups are O(k)."""
+
+    def __init__(self, ids: np.ndarray, scores: np.ndarray):
+        self.ids = ids
+        self.scores = scores
+
+    @property
+    def k(self) -> int:
+        return self.ids.shape[1]
+
+    @classmethod
+    def load(cls, source: Path = EMBEDDINGS_PATH) -> "KnnGraph":
+        ids_path, scores_path = graph_paths(source)
+        if not ids_path.exists():
+            raise FileNotFoundError(
+                f"kNN graph not found at {ids_path}. "
+                "Run: python -m scripts.knn_graph"
+            )
+        return cls(
+            np.load(ids_path, mmap_mode="r"),
+            np.load(scores_path, mmap_mode="r"),
+        )
+
+    def save(self, source: Path = EMBEDDINGS_PATH):
+        ids_path, scores_path = graph_paths(source)
+        np.save(ids_path, self.ids)
+        np.save(scores_path, self.scores)
+
+    def neighbours(self, i: int, k: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(row indices, scores) of the bayts closest to row i, best first."""
+        k = self.k if k is None else min(k, self.k)
+        return np.asarray(self.ids[i, :k], dtype=np.int64), \
+            np.asarray(self.scores[i, :k], dtype=np.float32)
+
+    def resonant(self, rows: Sequence[BaytRow], i: int, k: int = 5) -> TopK:
+        """Bayts resonant with row i, as a TopK over `rows`."""
+        idx, scores = self.neighbours(i, k)
+        return TopK(indices=idx, scores=scores, rows=[rows[j] for j in idx])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the bayt-to-bayt kNN graph")
+    parser.add_argument("--source", type=Path, default=EMBEDDINGS_PATH)
+    parser.add_argument("--k", type=int, default=KNN_K)
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    args = parser.parse_args()
+
+    embeddings = np.load(args.source, mmap_mode="r")
+
+    t0 = time.perf_counter()
+    ids, scores = build_knn_graph(embeddings, args.k, block_size=args.block_size)
+    KnnGraph(ids, scores).save(args.source)
+
+    print(f"Built kNN graph k={ids.shape[1]} over {len(ids)} rows "
+          f"in {time.perf_counter() - t0:.1f}s → {graph_paths(args.source)[0]}")
+
+
+if __name__ == "__main__":
+    main()
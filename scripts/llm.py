@@ -0,0 +1,165 @@
+# scripts/llm.py
+# Shared OpenAI client for the annotation scripts
+#
+# The client (and the openai package itself) is created on first use, so
+# importing an annotation script — or running it with bad arguments —
+# does not pay for client setup. One client means one HTTP connection
+# pool for all in-flight requests (scripts/annotation_runner.py).
+#
+# Responses are cached on disk (AppendLog) under
+#   sha256(model, system prompt, user prompt, sampling params)
+# and shared by all annotation scripts. Calls are deterministic in
+# practice (temperature 0, fixed seed, frozen prompts), so re-running a
+# pipeline version costs no API calls. Cache modes:
+#   readwrite  hits are served from disk, misses call the API and are stored
+#   replay     hits only; a miss raises CacheMiss and no request is made
+#   off        always call the API, store nothing
+
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence
+
+from scripts.disk_cache import AppendLog
+
+LLM_CACHE_PATH = Path("data/cache/llm_responses.log")
+CACHE_MODES = ("readwrite", "replay", "off")
+
+_async_client = None
+_cache: Optional[AppendLog] = None
+_cache_mode = "readwrite"
+_cache_path = LLM_CACHE_PATH
+cache_stats = {"hits": 0, "misses": 0}
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a prompt has no cached response."""
+
+
+MAX_OUTPUT_TOKENS = 512  # budgeted per call until the response reports usage
+
+
+def get_async_client():
+    """Process-wide AsyncOpenAI client, created on first call."""
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+
+        # retries are ours (annotation_runner.RetryPolicy), so 429s reach
+        # the concurrency controller instead of being absorbed here
+        _async_client = AsyncOpenAI(max_retries=0)
+    return _async_client
+
+
+def configure_cache(mode: str = "readwrite", path: Path = LLM_CACHE_PATH):
+    global _cache, _cache_mode, _cache_path
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown cache mode {mode!r}; available: {list(CACHE_MODES)}")
+    if _cache is not None and path != _cache_path:
+        _cache.close()
+        _cache = None
+    _cache_mode, _cache_path = mode, path
+
+
+def get_cache() -> Optional[AppendLog]:
+    """The shared response log, opened on first use (None when mode is off)."""
+    global _cache
+    if _cache_mode == "off":
+        return None
+    if _cache is None:
+        _cache = AppendLog(_cache_path)
+    return _cache
+
+
+def cache_key(model: str, messages: list, **params) -> str:
+    """Content address of one request: sha256 over its canonical JSON."""
+    payload = json.dumps(
+        {"model": model, "messages": messages, **params},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(*texts: str, max_output: int = MAX_OUTPUT_TOKENS) -> int:
+    """
+    Conservative prompt+completion estimate for the TPM bucket.
+    Persian runs at roughly 2–3 characters per token; the limiter is
+    corrected with the real usage once the response arrives.
+    """
+    return sum(len(t) for t in texts) // 2 + max_output
+
+
+async def chat(
+    system: str,
+    user: str,
+    *,
+    model: str,
+    limiter=None,
+    temperature: float = 0.0,
+    top_p: float = 1.0,
+    seed: Optional[int] = 42,
+    parse: Optional[Callable[[str], Any]] = None,
+    cache_tag: Optional[str] = None,
+    response_format: Optional[dict] = None,
+    history: Sequence[dict] = (),
+) -> Any:
+    """
+    One chat completion through the response cache and the pooled async
+    client; returns the content, or `parse(content)`. Cache hits cost no
+    rate-limit budget. A response is cached only once `parse` accepts it,
+    so a retried malformed reply is not replayed. `cache_tag` separates
+    deliberate re-asks of the same prompt (e.g. attempt 2) in the cache;
+    it is not sent to the API. `response_format` selects JSON mode or a
+    JSON schema; `history` continues the conversation after `user`
+    (e.g. the rejected reply and a correction).
+    """
+    parse = parse or (lambda content: content)
+    messages = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+        *history,
+    ]
+    params = {"temperature": temperature, "top_p": top_p, "seed": seed}
+    if response_format is not None:
+        params["response_format"] = response_format
+
+    cache = get_cache()
+    key = None
+    if cache is not None:
+        tag = {"cache_tag": cache_tag} if cache_tag is not None else {}
+        key = cache_key(model, messages, **params, **tag)
+        cached = cache.get(key)
+        if cached is not None:
+            cache_stats["hits"] += 1
+            return parse(json.loads(cached)["content"])
+        cache_stats["misses"] += 1
+        if _cache_mode == "replay":
+            raise CacheMiss(f"no cached response for {model} request {key[:12]}")
+
+    estimated = estimate_tokens(system, user, *(m["content"] for m in history))
+    if limiter is not None:
+        await limiter.acquire(estimated)
+
+    response = await get_async_client().chat.completions.create(
+        model=model,
+        messages=messages,
+        **params,
+    )
+
+    usage = response.usage.total_tokens if response.usage is not None else None
+    if limiter is not None and usage is not None:
+        limiter.settle(estimated, usage)
+
+    content = response.choices[0].message.content
+    result = parse(content)
+    if cache is not None and content is not None:
+        cache.put(key, json.dumps({
+            "content": content,
+            "model": response.model,
+            "total_tokens": usage,
+            "cached_at": time.time(),
+        }, ensure_ascii=False))
+    return result
@@ -0,0 +1,310 @@
+# scripts/mock_llm_server.py
+# Local OpenAI-compatible stand-in for benchmarking the annotation scripts
+#
+#   python -m scripts.mock_llm_server --port 8090 --latency-ms 300 --rate-429 0.02
+#   OPENAI_BASE_URL=http://127.0.0.1:8090/v1 OPENAI_API_KEY=mock \
+#       python -m scripts.extract_bayt_annotations --cache off
+#
+#   POST /v1/chat/completions   chat completion (non-streaming)
+#   GET  /metrics               requests by kind, injected faults
+#   GET  /healthz
+#
+# Replies are deterministic functions of the request: the prompt is
+# recognised (ghazal axis, bayt, packed bayts, corrective turn, hint
+# repair) and answered in the shape the script expects. --invalid-rate and
+# --long-hint-rate pick, by prompt hash, the bayts whose affect is out of
+# vocabulary (half near misses the local fuzzy mapping fixes, half not)
+# and whose hint is long enough for the repair pass. A corrective turn is
+# always answered validly.
+#
+# Transport faults are drawn from a seeded RNG per request: 429s (with
+# retry-after-ms), 500s and truncated JSON content. --rpm additionally
+# enforces a real requests-per-minute budget with 429s, like the API.
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from collections import Counter
+from http import HTTPStatus
+
+from prompts.prompts_v1 import GHAZAL_AXIS_PROMPT
+from prompts.repair_prompts_v1 import REPAIR_SYSTEM_PROMPT
+from scripts.annotation_runner import TokenBucket
+from scripts.extract_bayt_annotations import AFFECT_VOCAB
+from scripts.server import _read_request, _response
+
+HOST = "127.0.0.1"
+PORT = 8090
+LATENCY_MS = 200.0
+JITTER_MS = 100.0
+INVALID_RATE = 0.05
+LONG_HINT_RATE = 0.1
+
+_AXIS_MARKER = GHAZAL_AXIS_PROMPT.split("{")[0]
+_PACKED_ID = re.compile(r"\[bayt_id=(\d+)\]")
+_WORDS = "دل یار می عشق باده ساقی زلف چشم شب صبح گل بلبل راز خرابات رند زاهد".split()
+_NEAR_MISSES = ["غم", "امیدواری", "اشتیاق", "بیقراری"]
+_UNKNOWN_AFFECTS = ["خشم", "نفرت", "ترس"]
+
+
+def _digest(*parts: str) -> int:
+    return int.from_bytes(hashlib.sha256("\x1f".join(parts).encode("utf-8")).digest()[:8], "big")
+
+
+def _fraction(h: int, salt: int) -> float:
+    """A uniform [0, 1) value derived from the hash `h`."""
+    return ((h >> salt) & 0xFFFF) / 0x10000
+
+
+class MockLLM:
+    """Answers chat completion bodies; holds the fault settings and counters."""
+
+    def __init__(
+        self,
+        *,
+        latency_ms: float = LATENCY_MS,
+        jitter_ms: float = JITTER_MS,
+        invalid_rate: float = INVALID_RATE,
+        long_hint_rate: float = LONG_HINT_RATE,
+        rate_429: float = 0.0,
+        error_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        rpm: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.invalid_rate = invalid_rate
+        self.long_hint_rate = long_hint_rate
+        self.rate_429 = rate_429
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.bucket = TokenBucket(rpm, burst=max(1.0, rpm / 60.0)) if rpm > 0 else None
+        self.rng = random.Random(seed)
+        self.kinds = Counter()
+        self.faults = Counter()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    # -- replies ------------------------------------------------------------
+
+    def _hint(self, h: int) -> str:
+        n = 10 if _fraction(h, 16) < self.long_hint_rate else 2 + h % 3
+        return " ".join(_WORDS[(h >> (4 * i)) % len(_WORDS)] for i in range(n))
+
+    def _annotation(self, h: int) -> dict:
+        if _fraction(h, 32) < self.invalid_rate:
+            pool = _NEAR_MISSES if h % 2 else _UNKNOWN_AFFECTS
+            affect = [pool[(h >> 8) % len(pool)]]
+        else:
+            affect = [AFFECT_VOCAB[(h >> 8) % len(AFFECT_VOCAB)]][: h % 3]
+        return {"bayt_hint": self._hint(h), "affect": affect}
+
+    def reply(self, body: dict) -> tuple:
+        """(kind, content) for one request body."""
+        messages = body["messages"]
+        system, user = messages[0]["content"], messages[1]["content"]
+        h = _digest(body.get("model", ""), user)
+
+        if system == REPAIR_SYSTEM_PROMPT:
+            return "repair", " ".join(_WORDS[(h >> (4 * i)) % len(_WORDS)] for i in range(3))
+        if user.startswith(_AXIS_MARKER):
+            return "axis", " ".join(_WORDS[(h >> (4 * i)) % len(_WORDS)] for i in range(2))
+        if len(messages) > 2:
+            annotation = self._annotation(h)
+            annotation["affect"] = [AFFECT_VOCAB[h % len(AFFECT_VOCAB)]]
+            return "corrective", json.dumps(annotation, ensure_ascii=False)
+
+        ids = _PACKED_ID.findall(user)
+        if ids:
+            bayts = [
+                {"bayt_id": int(i), **self._annotation(_digest(str(h), i))}
+                for i in ids
+            ]
+            return "packed", json.dumps({"bayts": bayts}, ensure_ascii=False)
+        return "bayt", json.dumps(self._annotation(h), ensure_ascii=False)
+
+    # -- one request ---------------------------------------------------------
+
+    async def complete(self, body: dict):
+        """(status, reply, headers) for POST /v1/chat/completions."""
+        self.requests += 1
+        # throttling is decided on arrival and answered at once, like the API
+        if self.bucket is not None:
+            wait = self.bucket.try_acquire(1)
+            if wait > 0:
+                return self._throttled("rpm", int(1000 * wait) + 1)
+        if self.rng.random() < self.rate_429:
+            return self._throttled("429", self.rng.randint(50, 500))
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+            return self._complete(body)
+        finally:
+            self.in_flight -= 1
+
+    def _complete(self, body: dict):
+        if self.rng.random() < self.error_rate:
+            self.faults["500"] += 1
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {
+                "error": {"message": "The server had an error while processing your request.",
+                          "type": "server_error", "code": None},
+            }, None
+
+        try:
+            kind, content = self.reply(body)
+        except (KeyError, IndexError, TypeError):
+            return HTTPStatus.BAD_REQUEST, {
+                "error": {"message": "expected messages[system, user, ...]",
+                          "type": "invalid_request_error", "code": None},
+            }, None
+        self.kinds[kind] += 1
+
+        if kind not in ("axis", "repair") and self.rng.random() < self.malformed_rate:
+            self.faults["malformed"] += 1
+            content = content[: len(content) // 2]
+
+        prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 2
+        completion_tokens = len(content) // 2
+        return HTTPStatus.OK, {
+            "id": f"chatcmpl-mock-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }, None
+
+    def _throttled(self, reason: str, wait_ms: int):
+        self.faults[reason] += 1
+        return HTTPStatus.TOO_MANY_REQUESTS, {
+            "error": {"message": f"Rate limit reached (mock). Please try again in {wait_ms}ms.",
+                      "type": "requests", "code": "rate_limit_exceeded"},
+        }, {"retry-after-ms": str(wait_ms)}
+
+    def metrics(self) -> dict:
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "kinds": dict(self.kinds),
+            "faults": dict(self.faults),
+        }
+
+
+async def _handle(mock: MockLLM, reader, writer):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                writer.write(_response(HTTPStatus.BAD_REQUEST, {"error": "malformed request"}, keep_alive=False))
+                break
+            if request is None:
+                break
+
+            method, path, headers, body = request
+            keep_alive = headers.get("connection", "").lower() != "close"
+
+            if method == "GET" and path == "/healthz":
+                status, reply, extra = HTTPStatus.OK, {"ok": True}, None
+            elif method == "GET" and path == "/metrics":
+                status, reply, extra = HTTPStatus.OK, mock.metrics(), None
+            elif method == "POST" and path.split("?")[0] == "/v1/chat/completions":
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    status, reply, extra = HTTPStatus.BAD_REQUEST, {"error": "invalid JSON body"}, None
+                else:
+                    status, reply, extra = await mock.complete(payload)
+            else:
+                status, reply, extra = HTTPStatus.NOT_FOUND, {"error": f"no route {method} {path}"}, None
+
+            writer.write(_response(status, reply, keep_alive=keep_alive, headers=extra))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(mock: MockLLM, host: str = HOST, port: int = PORT):
+    server = await asyncio.start_server(lambda r, w: _handle(mock, r, w), host=host, port=port)
+    print(f"[MOCK] listening on http://{host}:{port}/v1", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def add_fault_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    parser.add_argument("--jitter-ms", type=float, default=JITTER_MS)
+    parser.add_argument("--invalid-rate", type=float, default=INVALID_RATE,
+                        help="Fraction of bayts answered with an out-of-vocabulary affect")
+    parser.add_argument("--long-hint-rate", type=float, default=LONG_HINT_RATE,
+                        help="Fraction of bayt hints long enough to need repair")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests throttled")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="Fraction of JSON replies truncated")
+    parser.add_argument("--rpm", type=float, default=0.0, help="Enforced requests per minute (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def fault_args(args: argparse.Namespace) -> list:
+    """`add_fault_args` values as command-line arguments again."""
+    return [
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms),
+        "--invalid-rate", str(args.invalid_rate),
+        "--long-hint-rate", str(args.long_hint_rate),
+        "--rate-429", str(args.rate_429),
+        "--error-rate", str(args.error_rate),
+        "--malformed-rate", str(args.malformed_rate),
+        "--rpm", str(args.rpm),
+        "--seed", str(args.seed),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions server")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    add_fault_args(parser)
+    args = parser.parse_args()
+
+    mock = MockLLM(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        invalid_rate=args.invalid_rate,
+        long_hint_rate=args.long_hint_rate,
+        rate_429=args.rate_429,
+        error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate,
+        rpm=args.rpm,
+        seed=args.seed,
+    )
+    try:
+        asyncio.run(serve(mock, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
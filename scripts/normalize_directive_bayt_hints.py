@@ -22,7 +22,6 @@ Output:
 
 import json
 from pathlib import Path
-import copy
 
 IN_PATH = Path("data/annotations/bayt_annotations_v1_2.jsonl")
 OUT_PATH = Path("data/annotations/bayt_annotations_v1_3.jsonl")
@@ -35,20 +34,43 @@ DIRECTIVE_PREFIXES = (
     "بهره‌گیری از",
 )
 
+# the v1.2 pass (explicit directives); v1.3 applies the full list above
+EXPLICIT_DIRECTIVE_PREFIXES = DIRECTIVE_PREFIXES[:3]
 
+NORM_RULE = "remove_directive_prefix"
 
-def normalize_hint(hint: str) -> str | None:
+
+def normalize_hint(hint: str, prefixes: tuple = DIRECTIVE_PREFIXES) -> str | None:
     """
     If hint starts with a directive prefix, remove it.
     Return normalized hint, or None if no change.
     """
-    for p in DIRECTIVE_PREFIXES:
+    for p in prefixes:
         if hint.startswith(p):
             new_hint = hint[len(p):].strip()
             return new_hint if new_hint else None
     return None
 
 
+def normalize_row(r: dict, prefixes: tuple = DIRECTIVE_PREFIXES) -> dict:
+    """
+    `r` with its hint normalized. Unchanged rows are returned as-is;
+    changed rows get a shallow copy with fresh annotation_meta.
+    """
+    new_hint = normalize_hint(r["bayt_hint"], prefixes)
+    if new_hint is None:
+        return r
+
+    r_new = dict(r)
+    r_new["bayt_hint"] = new_hint
+    r_new["annotation_meta"] = {
+        **r.get("annotation_meta", {}),
+        "manual_norm": True,
+        "manual_norm_rule": NORM_RULE,
+    }
+    return r_new
+
+
 def main():
     assert IN_PATH.exists(), f"Input file not found: {IN_PATH}"
     OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
@@ -63,20 +85,8 @@ def main():
             r = json.loads(line)
             total += 1
 
-            r_new = copy.deepcopy(r)
-            old_hint = r_new["bayt_hint"]
-            new_hint = normalize_hint(old_hint)
-
-            if new_hint is not None:
-                r_new["bayt_hint"] = new_hint
-
-                meta = r_new.get("annotation_meta", {})
-                meta.update({
-                    "manual_norm": True,
-                    "manual_norm_rule": "remove_directive_prefix",
-                })
-                r_new["annotation_meta"] = meta
-
+            r_new = normalize_row(r)
+            if r_new is not r:
                 changed += 1
 
             fout.write(json.dumps(r_new, ensure_ascii=False) + "\n")
@@ -0,0 +1,176 @@
+# scripts/query_cache.py
+# Persian query normalization + two-tier query-embedding cache
+#
+# Tier 1: in-process LRU, bounded by entry count.
+# Tier 2: on-disk AppendLog keyed by "<model_id>:<sha256(normalized text)>".
+#
+# Normalization here applies to user queries only, never to bayt text
+# (see "Preservation of form" in docs/design-decisions.md).
+
+import base64
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from scripts.disk_cache import AppendLog
+
+QUERY_CACHE_PATH = Path("data/cache/query_embeddings.log")
+LRU_SIZE = 4096
+
+# Arabic code points that have a Persian counterpart, and both digit sets
+_CHAR_MAP = str.maketrans({
+    "\u064a": "\u06cc",  # ي → ی
+    "\u0649": "\u06cc",  # ى → ی
+    "\u0643": "\u06a9",  # ك → ک
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06f0 + d): str(d) for d in range(10)},
+})
+
+# zero-width characters (ZWSP, ZWNJ, ZWJ, BOM), tatweel and harakat;
+# dropping ZWNJ folds "می‌رسم" onto "میرسم"
+_DROP = re.compile("[\u200b\u200c\u200d\ufeff\u0640\u064b-\u0652\u0670]")
+# "می رسم" → "میرسم": a spaced می/نمی is joined only to a word that ends
+# like a conjugated verb (personal ending م/ی/د, past stem ت), so the noun
+# «می» (wine) in "جام می و خون دل" or "می ناب" stays a word of its own
+_VERB_PREFIX = re.compile(r"(?<!\S)(ن?می) (?=\w+[میدت]\b)")
+_TRAILING_PUNCT = re.compile(r"[\s?!.,;:…؟،؛«»\"'()]+$")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """
+    Fold spelling variants of the same question onto one key:
+    NFKC, Arabic → Persian yeh/kaf, ASCII digits, no zero-width joiners
+    or diacritics, joined می/نمی verb prefixes, collapsed whitespace and
+    no trailing punctuation.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    text = text.translate(_CHAR_MAP)
+    text = _DROP.sub("", text)
+    text = _SPACES.sub(" ", text).strip()
+    text = _TRAILING_PUNCT.sub("", text)
+    return _VERB_PREFIX.sub(r"\1", text)
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class QueryEmbeddingCache:
+    """
+    Normalizes the query, then serves its embedding from memory, from disk,
+    or (on a miss) from `embed`, which is called with the normalized text,
+    so every spelling variant of a key gets the same vector.
+    `embed_batch`, if given, embeds all misses of a `get_many` call at once.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], np.ndarray],
+        model_id: str,
+        *,
+        embed_batch: Optional[Callable[[List[str]], np.ndarray]] = None,
+        max_entries: int = LRU_SIZE,
+        path: Optional[Path] = QUERY_CACHE_PATH,
+    ):
+        self.embed = embed
+        self.embed_batch = embed_batch
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = AppendLog(path) if path is not None else None
+
+    def _key(self, normalized: str) -> str:
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return f"{self.model_id}:{digest}"
+
+    def _remember(self, key: str, emb: np.ndarray):
+        with self._lock:
+            self._lru[key] = emb
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+                self.stats.evictions += 1
+
+    def _lookup(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            emb = self._lru.get(key)
+            if emb is not None:
+                self._lru.move_to_end(key)
+                self.stats.memory_hits += 1
+                return emb
+
+        if self._disk is not None:
+            stored = self._disk.get(key)
+            if stored is not None:
+                emb = np.frombuffer(base64.b64decode(stored), dtype=np.float32)
+                self.stats.disk_hits += 1
+                self._remember(key, emb)
+                return emb
+
+        return None
+
+    def _store(self, key: str, emb: np.ndarray) -> np.ndarray:
+        emb = np.array(emb, dtype=np.float32)
+        emb.flags.writeable = False
+        if self._disk is not None:
+            self._disk.put(key, base64.b64encode(emb.tobytes()).decode("ascii"))
+        self._remember(key, emb)
+        return emb
+
+    def get(self, text: str) -> np.ndarray:
+        normalized = normalize_query(text)
+        key = self._key(normalized)
+
+        emb = self._lookup(key)
+        if emb is not None:
+            return emb
+
+        self.stats.misses += 1
+        return self._store(key, self.embed(normalized))
+
+    def get_many(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        (len(texts), d) embeddings. Misses are deduplicated and, with
+        `embed_batch`, sent to the model in a single call.
+        """
+        normalized = [normalize_query(t) for t in texts]
+        keys = [self._key(n) for n in normalized]
+        found = {k: self._lookup(k) for k in dict.fromkeys(keys)}
+
+        missing = [k for k, v in found.items() if v is None]
+        if missing:
+            self.stats.misses += len(missing)
+            text_of = dict(zip(keys, normalized))
+            batch = [text_of[k] for k in missing]
+            if self.embed_batch is not None:
+                embs = self.embed_batch(batch)
+            else:
+                embs = [self.embed(t) for t in batch]
+            for k, emb in zip(missing, embs):
+                found[k] = self._store(k, emb)
+
+        return np.stack([found[k] for k in keys])
+
+    def __call__(self, text: str) -> np.ndarray:
+        return self.get(text)
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
@@ -1,11 +1,23 @@
 # scripts/repair_bayt_hints.py
 # Repair overlong or interpretive bayt_hints (v1.1)
-
+#
+#   python -m scripts.repair_bayt_hints [--rule bayt_hint_len>8]
+#
+# Only rows matching the repair rule (REPAIR_RULES) are sent to the model,
+# through the concurrent, rate-limited runner; all other rows stream
+# straight through without taking a request slot. Output stays in input
+# order, so the checkpoint resumes row by row.
+
+import argparse
+import asyncio
 import json
 import time
 from pathlib import Path
+from typing import Callable
 
-from openai import OpenAI, RateLimitError
+from scripts.annotation_runner import RateLimiter, RetryPolicy, add_runner_args, from_args, run_ordered
+from scripts.checkpoint import Checkpoint
+from scripts.llm import cache_stats, chat
 
 from prompts.repair_prompts_v1 import (
     REPAIR_SYSTEM_PROMPT,
@@ -20,8 +32,6 @@ OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 RAW_PATH = Path("data/raw/ghazals_with_insight.jsonl")
 
-client = OpenAI()
-
 
 def load_raw_text():
     raw = {}
@@ -32,79 +42,133 @@ def load_raw_text():
     return raw
 
 
-def call_gpt(prompt: str) -> str:
-    while True:
-        try:
-            resp = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": REPAIR_SYSTEM_PROMPT},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.0,
-                top_p=1.0,
-                seed=42,
-            )
-            return resp.choices[0].message.content.strip()
-        except RateLimitError:
-            time.sleep(1.0)
+async def call_gpt(prompt: str, limiter: RateLimiter, retry: RetryPolicy, label: str = "") -> str:
+    async def attempt() -> str:
+        content = await chat(
+            REPAIR_SYSTEM_PROMPT,
+            prompt,
+            model=MODEL_NAME,
+            limiter=limiter,
+            temperature=0.0,
+            top_p=1.0,
+            seed=42,
+        )
+        return content.strip()
+
+    return await retry.call(attempt, label=label)
+
+
+def needs_repair(hint: str) -> bool:
+    return len(hint.split()) > 8
+
+
+# rule name (recorded as annotation_meta.repair_rule) -> hint predicate
+REPAIR_RULES = {
+    "bayt_hint_len>8": needs_repair,
+}
+REPAIR_RULE = "bayt_hint_len>8"
+
+
+async def repair_hint(
+    r: dict,
+    bayt_text: str,
+    limiter: RateLimiter,
+    retry: RetryPolicy,
+    predicate: Callable[[str], bool] = needs_repair,
+) -> str:
+    """New hint; rows the predicate does not select pass through without a call."""
+    old_hint = r["bayt_hint"]
+    if not predicate(old_hint):
+        return old_hint
+
+    prompt = REPAIR_BAYT_HINT_PROMPT.format(
+        bayt_text=bayt_text,
+        old_hint=old_hint,
+    )
+    candidate = await call_gpt(prompt, limiter, retry, label=str((r["poem_id"], r["bayt_id"])))
+
+    # accept only if genuinely shorter and non-empty
+    if candidate and len(candidate.split()) < len(old_hint.split()):
+        return candidate
+    return old_hint
+
+
+def repaired_record(r: dict, new_hint: str, rule: str = REPAIR_RULE) -> dict:
+    """The v1.1 record: `r` with its (possibly) repaired hint and repair meta."""
+    out = dict(r)
+    out["bayt_hint"] = new_hint
+    out["annotation_meta"] = {
+        **r.get("annotation_meta", {}),
+        "repair": new_hint != r["bayt_hint"],
+        "repair_rule": rule,
+    }
+    return out
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Repair overlong bayt_hints (v1.1)")
+    add_runner_args(parser)
+    parser.add_argument("--rule", choices=list(REPAIR_RULES), default=REPAIR_RULE,
+                        help="Which rows are sent for repair")
+    args = parser.parse_args()
+
+    predicate = REPAIR_RULES[args.rule]
     raw_text = load_raw_text()
+    limiter, gate, retry = from_args(args)
 
-    done_keys = set()
-    if OUT_PATH.exists():
-        with OUT_PATH.open("r", encoding="utf-8") as f:
-            for line in f:
-                r = json.loads(line)
-                done_keys.add((r["poem_id"], r["bayt_id"]))
+    ckpt = Checkpoint(IN_PATH, OUT_PATH)
 
-    with IN_PATH.open("r", encoding="utf-8") as fin, \
-         OUT_PATH.open("a", encoding="utf-8") as fout:
+    def pending():
+        for r, end in ckpt.lines():
+            if not ckpt.is_done(r):
+                yield r, end
 
-        for line in fin:
-            r = json.loads(line)
-            key = (r["poem_id"], r["bayt_id"])
+    def passthrough(item: tuple) -> bool:
+        r, _ = item
+        return not predicate(r["bayt_hint"])
+
+    async def repair(item: tuple) -> str:
+        r, _ = item
+        return await repair_hint(
+            r, raw_text[(r["poem_id"], r["bayt_id"])], limiter, retry, predicate,
+        )
 
-            if key in done_keys:
-                continue
+    counts = {"passed": 0, "kept": 0, "repaired": 0}
+    t0 = time.perf_counter()
 
+    with ckpt:
+        fout = ckpt.open_output()
+
+        def write(item: tuple, new_hint):
+            r, end = item
+            key = (r["poem_id"], r["bayt_id"])
             old_hint = r["bayt_hint"]
-            repaired = False
-            new_hint = old_hint
-
-            if len(old_hint.split()) > 8:
-                prompt = REPAIR_BAYT_HINT_PROMPT.format(
-                    bayt_text=raw_text[key],
-                    old_hint=old_hint,
-                )
-                candidate = call_gpt(prompt)
-
-                # accept only if genuinely shorter and non-empty
-                if candidate and len(candidate.split()) < len(old_hint.split()):
-                    new_hint = candidate
-                    repaired = True
-
-            out = dict(r)
-            out["bayt_hint"] = new_hint
-            out["annotation_meta"] = {
-                **r.get("annotation_meta", {}),
-                "repair": repaired,
-                "repair_rule": "bayt_hint_len>8",
-            }
+            candidate = new_hint is not None
+            new_hint = new_hint if candidate else old_hint
+            repaired = new_hint != old_hint
+            out = repaired_record(r, new_hint, args.rule)
 
             fout.write(json.dumps(out, ensure_ascii=False) + "\n")
-            fout.flush()
+            ckpt.advance([r], end)
 
             if repaired:
+                counts["repaired"] += 1
                 print(f"[REPAIRED] {key}:")
                 print("  old:", old_hint)
                 print("  new:", new_hint)
-            else:
+            elif candidate:
+                counts["kept"] += 1
                 print(f"[KEPT] {key}")
+            else:
+                counts["passed"] += 1
+
+        asyncio.run(run_ordered(pending(), repair, write, concurrency=gate, skip=passthrough))
 
-            time.sleep(0.25)
+    total = sum(counts.values())
+    print(f"[DONE] {total} rows in {time.perf_counter() - t0:.1f}s: "
+          f"{counts['repaired']} repaired, {counts['kept']} kept, "
+          f"{counts['passed']} passed through")
+    print(f"[CACHE] {cache_stats['hits']} hits, {cache_stats['misses']} misses")
 
 
 if __name__ == "__main__":
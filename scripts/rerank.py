@@ -0,0 +1,82 @@
+# scripts/rerank.py
+# Maximal-marginal-relevance (MMR) diversity re-ranking of retrieval candidates
+#
+#   hits = retriever.search(q, k=30)
+#   diverse = mmr_rerank(hits, retriever.store.vectors(hits.indices), k=5,
+#                        max_per_poem=1)
+
+from typing import Optional
+
+import numpy as np
+
+from scripts.retrieval import TopK
+
+MMR_LAMBDA = 0.7
+
+
+def _take(candidates: TopK, picked) -> TopK:
+    picked = np.asarray(picked, dtype=np.int64)
+    return TopK(
+        indices=candidates.indices[picked],
+        scores=candidates.scores[picked],
+        rows=[candidates.rows[j] for j in picked],
+        fallback=candidates.fallback,
+    )
+
+
+def mmr_rerank(
+    candidates: TopK,
+    vectors: np.ndarray,
+    k: int,
+    *,
+    lambda_: float = MMR_LAMBDA,
+    max_per_poem: Optional[int] = None,
+) -> TopK:
+    """
+    Pick k of the candidates, trading relevance against redundancy:
+
+        score = λ · sim(query, c) − (1 − λ) · max sim(c, already picked)
+
+    `vectors` are the candidates' unit embeddings, in candidate order.
+    Candidate-to-candidate similarity is one (c × c) product; each step
+    then costs one vectorized max update. With `max_per_poem`, at most
+    that many bayts from the same ghazal are picked; fewer than k may
+    come back if the candidates run out. k <= 0 picks nothing.
+    """
+    if max_per_poem is not None and max_per_poem < 1:
+        raise ValueError(f"max_per_poem must be at least 1, got {max_per_poem}")
+
+    c = len(candidates.indices)
+    k = min(k, c)
+    if k <= 0:
+        return _take(candidates, [])
+
+    relevance = np.asarray(candidates.scores, dtype=np.float32)
+    pairwise = vectors @ vectors.T
+    redundancy = np.zeros(c, dtype=np.float32)
+    available = np.ones(c, dtype=bool)
+
+    poem_ids = None
+    if max_per_poem is not None:
+        poem_ids = np.array([r["poem_id"] for r in candidates.rows])
+        per_poem = {}
+
+    picked = []
+    for _ in range(k):
+        if not available.any():
+            break
+        mmr = lambda_ * relevance - (1.0 - lambda_) * redundancy
+        mmr[~available] = -np.inf
+        j = int(np.argmax(mmr))
+
+        picked.append(j)
+        available[j] = False
+        np.maximum(redundancy, pairwise[j], out=redundancy)
+
+        if poem_ids is not None:
+            pid = poem_ids[j]
+            per_poem[pid] = per_poem.get(pid, 0) + 1
+            if per_poem[pid] >= max_per_poem:
+                available &= poem_ids != pid
+
+    return _take(candidates, picked)
@@ -3,8 +3,12 @@
 import json
 import numpy as np
 from pathlib import Path
-from typing import List
+from typing import List, NamedTuple, Optional, Sequence, Union
 
+from scripts.corpus_snapshot import Corpus, check_alignment, is_fresh, rows_digest, snapshot_dir
+from scripts.embedding_store import EmbeddingStore
+from scripts.filters import MetadataIndex, Where
+from scripts.tracing import traced
 from scripts.types import BaytRow
 
 DATASET_PATH = Path("data/datasets/bayts_canonical_v1.jsonl")
@@ -14,30 +18,307 @@ def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
     return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
 
 
-def load_dataset() -> List[BaytRow]:
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the `k` largest scores, best first.
+    Uses partial selection, so only the k winners are sorted.
+    Ties are broken by lower row index.
+    """
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(n)
+    order = np.lexsort((part, -scores[part]))
+    return part[order]
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """`top_k_indices` applied to every row of a (Q, n) score matrix."""
+    n = scores.shape[1]
+    k = min(k, n)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape)
+    picked = np.take_along_axis(scores, part, axis=1)
+    order = np.lexsort((part, -picked), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+class TopK(NamedTuple):
+    indices: np.ndarray   # row positions into the corpus, best first
+    scores: np.ndarray    # cosine similarity per index
+    rows: List[BaytRow]   # corpus rows for `indices`
+    fallback: bool = False  # filter matched too few rows; ranking was topped up
+
+
+class BatchTopK(NamedTuple):
+    indices: np.ndarray          # (Q, k) row positions, best first per query
+    scores: np.ndarray           # (Q, k) cosine similarities
+    rows: List[List[BaytRow]]    # corpus rows per query
+
+
+class BaytRetriever:
+    """
+    Exact cosine retrieval over the bayt embedding matrix.
+
+    The matrix is normalized once at construction; each query is then
+    scored with a single matrix-vector product. `embeddings` may be a raw
+    array or an `EmbeddingStore` (e.g. a memory-mapped int8 store).
+
+    An optional ANN `index` (see scripts/ann_index.py) replaces the full
+    scan for candidate generation; `exact=True` bypasses it per call.
+    """
+
+    def __init__(
+        self,
+        rows: Sequence[BaytRow],
+        embeddings: Union[np.ndarray, EmbeddingStore],
+        *,
+        index=None,
+    ):
+        if not isinstance(embeddings, EmbeddingStore):
+            embeddings = EmbeddingStore.from_array(embeddings)
+        if len(rows) != len(embeddings):
+            raise ValueError(
+                f"rows ({len(rows)}) and embeddings ({len(embeddings)}) "
+                "are not aligned"
+            )
+        self.rows = rows
+        self.store = embeddings
+        self.index = index
+        self._metadata = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def scores(self, query_embedding: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the query against every row."""
+        return self.store.scores(query_embedding)
+
+    @property
+    def metadata(self) -> MetadataIndex:
+        """Affect / lens / ghazal_axis masks, built on first filtered search."""
+        if self._metadata is None:
+            build = getattr(self.rows, "metadata_index", None)
+            self._metadata = build() if build else MetadataIndex.from_rows(self.rows)
+        return self._metadata
+
+    def _rank(
+        self,
+        query_embedding: np.ndarray,
+        n: int,
+        *,
+        allowed: Optional[np.ndarray] = None,
+        nprobe: Optional[int] = None,
+        exact: bool = False,
+    ):
+        """Top-n (indices, scores) over all rows, or only over `allowed`."""
+        if allowed is not None:
+            scores = self.store.scores(query_embedding, allowed)
+            best = top_k_indices(scores, n)
+            return allowed[best], scores[best]
+
+        if self.index is not None and not exact:
+            return self.index.search(query_embedding, n, nprobe=nprobe)
+
+        scores = self.scores(query_embedding)
+        idx = top_k_indices(scores, n)
+        return idx, scores[idx]
+
+    def _rescore(self, idx: np.ndarray, query_embedding: np.ndarray, k: int):
+        top = self.store.rescore(idx, query_embedding)
+        order = top_k_indices(top, k)
+        return idx[order], top[order]
+
+    @traced("retrieve")
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 1,
+        *,
+        min_score: Optional[float] = None,
+        rescore: int = 0,
+        nprobe: Optional[int] = None,
+        exact: bool = False,
+        where: Optional[Where] = None,
+    ) -> TopK:
+        """
+        Return the top-k rows for the query, best first.
+        Rows scoring below `min_score` are dropped, so fewer than k
+        results (possibly none) may come back.
+
+        With `rescore` > k, that many candidates are taken from the
+        (possibly quantized) store and re-ranked with exact float32 scores.
+
+        `where` (see scripts/filters.py) restricts scoring to matching rows.
+        If fewer than k rows match, the matches come first and the rest is
+        filled from the unfiltered ranking; the result is marked `fallback`.
+        """
+        n = max(k, rescore)
+        rank = dict(nprobe=nprobe, exact=exact)
+
+        allowed = None
+        fallback = False
+        if where is not None:
+            mask = self.metadata.mask(where)
+            allowed = np.flatnonzero(mask)
+            fallback = len(allowed) < k
+
+        idx, top = self._rank(query_embedding, n, allowed=allowed, **rank)
+        if rescore:
+            idx, top = self._rescore(idx, query_embedding, k)
+
+        if fallback:
+            extra, extra_top = self._rank(query_embedding, n + len(idx), **rank)
+            keep = ~mask[extra]
+            extra, extra_top = extra[keep], extra_top[keep]
+            if rescore:
+                extra, extra_top = self._rescore(extra, query_embedding, k)
+            idx = np.concatenate([idx, extra])[:k]
+            top = np.concatenate([top, extra_top])[:k]
+
+        idx, top = idx[:k], top[:k]
+
+        if min_score is not None:
+            keep = top >= min_score
+            idx, top = idx[keep], top[keep]
+
+        return TopK(
+            indices=idx,
+            scores=top,
+            rows=[self.rows[i] for i in idx],
+            fallback=fallback,
+        )
+
+    @traced("retrieve_batch")
+    def search_batch(
+        self,
+        queries: np.ndarray,
+        k: int = 1,
+        *,
+        block_size: int = 256,
+    ) -> BatchTopK:
+        """
+        Exact top-k for a (Q, d) query matrix, best first per query.
+
+        Queries are scored `block_size` at a time with one matrix-matrix
+        product per block, so peak scratch memory is block_size × n floats.
+        Rankings match `search(q, k, exact=True)` per query; scores agree
+        up to float32 rounding (BLAS sums GEMM and GEMV in different orders).
+        """
+        queries = np.atleast_2d(queries)
+        k = min(k, len(self))
+        indices = np.empty((queries.shape[0], k), dtype=np.int64)
+        scores = np.empty((queries.shape[0], k), dtype=np.float32)
+
+        for start in range(0, queries.shape[0], block_size):
+            stop = start + block_size
+            block = self.store.scores_batch(queries[start:stop])
+            best = top_k_rows(block, k)
+            indices[start:stop] = best
+            scores[start:stop] = np.take_along_axis(block, best, axis=1)
+
+        return BatchTopK(
+            indices=indices,
+            scores=scores,
+            rows=[[self.rows[i] for i in row] for row in indices],
+        )
+
+
+@traced()
+def load_corpus() -> Corpus:
+    """
+    Open the compiled snapshot of DATASET_PATH (see scripts/corpus_snapshot.py).
+    Columns are memory-mapped and rows are hydrated lazily.
+    """
+    path = snapshot_dir(DATASET_PATH)
+    if not is_fresh(DATASET_PATH, path):
+        raise FileNotFoundError(
+            f"No up-to-date snapshot at {path}. "
+            "Run: python -m scripts.corpus_snapshot"
+        )
+    return Corpus(path)
+
+
+@traced()
+def load_dataset() -> Sequence[BaytRow]:
+    """
+    Load the canonical dataset, from the compiled snapshot when it is
+    up to date, otherwise by parsing the JSONL. Raises ValueError when
+    EMBEDDINGS_PATH exists but its rows are not this dataset's rows.
+    """
+    if is_fresh(DATASET_PATH):
+        corpus = Corpus(snapshot_dir(DATASET_PATH))
+        if EMBEDDINGS_PATH.exists():
+            corpus.check_alignment(EMBEDDINGS_PATH)
+        return corpus
+
     rows = []
     with open(DATASET_PATH, encoding="utf-8") as f:
         for line in f:
             rows.append(json.loads(line))
+    if EMBEDDINGS_PATH.exists():
+        check_alignment(rows_digest(rows), len(rows), EMBEDDINGS_PATH)
     return rows
 
 
+@traced()
 def load_embeddings() -> np.ndarray:
     if not EMBEDDINGS_PATH.exists():
         raise FileNotFoundError(
             f"Embeddings not found at {EMBEDDINGS_PATH}. "
-            "Run embedding pipeline first or use CLI demo mode."
+            "Run: python -m scripts.build_embeddings"
         )
     return np.load(EMBEDDINGS_PATH)
 
 
+@traced()
+def load_embedding_store(dtype: str = "int8", *, mmap: bool = True) -> EmbeddingStore:
+    """
+    Open the memory-mapped store written by `python -m scripts.embedding_store`.
+    Processes opening the same store share its pages.
+    """
+    if not EMBEDDINGS_PATH.exists():
+        raise FileNotFoundError(
+            f"Embeddings not found at {EMBEDDINGS_PATH}. "
+            "Run: python -m scripts.build_embeddings"
+        )
+    return EmbeddingStore.open(EMBEDDINGS_PATH, dtype, mmap=mmap)
+
+
+def load_ann_index():
+    """
+    Load the IVF index persisted next to EMBEDDINGS_PATH.
+    Raises ValueError if it was built from other embeddings.
+    """
+    from scripts.ann_index import IVFIndex, index_path
+
+    return IVFIndex.load(index_path(EMBEDDINGS_PATH), EMBEDDINGS_PATH)
+
+
+_last_retriever = None  # (rows, embeddings, BaytRetriever) of the last call
+
 
+@traced()
 def retrieve_best_bayt(
     query_embedding: np.ndarray,
     *,
-    rows: List[BaytRow],
+    rows: Sequence[BaytRow],
     embeddings: np.ndarray,
 ) -> BaytRow:
-    sims = [cosine_sim(query_embedding, emb) for emb in embeddings]
-    idx = int(np.argmax(sims))
-    return rows[idx]
+    """
+    Helper kept for existing callers. The BaytRetriever is reused while
+    the same `rows` and `embeddings` objects are passed, so the matrix is
+    normalized once, not per query (arrays mutated in place are not
+    noticed). New code should hold a `BaytRetriever` itself.
+    """
+    global _last_retriever
+    last = _last_retriever
+    if last is None or last[0] is not rows or last[1] is not embeddings:
+        last = _last_retriever = (rows, embeddings, BaytRetriever(rows, embeddings))
+    return last[2].search(query_embedding, k=1).rows[0]
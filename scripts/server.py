@@ -0,0 +1,323 @@
+# scripts/server.py
+# asyncio HTTP server with request micro-batching
+#
+#   python -m scripts.server --port 8080 --window-ms 3 --max-batch 64
+#
+#   POST /fal       {"query": "..."}  → {"fal": "...", "poem_id": .., "bayt_id": .., "score": ..}
+#   GET  /metrics   queue depth, batch sizes, totals
+#   GET  /healthz
+#
+# Requests are queued; a single collector drains the queue in windows of
+# up to `window_ms` or `max_batch` requests, embeds and scores each window
+# as one batch (FalService.fal_batch) and resolves the waiting requests.
+# When the queue is full, new requests get 503 + Retry-After (backpressure).
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from typing import List, Tuple
+
+from scripts.config import QUERY_EMBEDDER
+from scripts.daemon import FalService
+from scripts.embedders import EMBEDDERS
+from scripts import tracing
+
+HOST = "127.0.0.1"
+PORT = 8080
+WINDOW_MS = 3.0
+MAX_BATCH = 64
+MAX_QUEUE = 1024
+MAX_BODY = 64 * 1024
+
+
+class QueueFull(Exception):
+    pass
+
+
+class MicroBatcher:
+    """
+    Collects queries for up to `window_ms` (or `max_batch` of them) and runs
+    `fn(list_of_queries) -> list_of_results` once per window on a worker thread.
+    """
+
+    def __init__(
+        self,
+        fn,
+        *,
+        window_ms: float = WINDOW_MS,
+        max_batch: int = MAX_BATCH,
+        max_queue: int = MAX_QUEUE,
+    ):
+        self.fn = fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.pool = ThreadPoolExecutor(max_workers=1)
+        self.batch_sizes = Counter()
+        self.submitted = 0
+        self.rejected = 0
+        self.failed = 0
+        self.abandoned = 0
+        self.batch_seconds = 0.0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self.pool.shutdown(wait=False)
+
+    async def submit(self, query: str):
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((query, fut))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFull from None
+        self.submitted += 1
+        return await fut
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # drop requests whose clients already went away (cancelled in _fal)
+            batch = [(q, f) for q, f in batch if not f.done()]
+            if not batch:
+                continue
+
+            self.batch_sizes[len(batch)] += 1
+            t0 = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(
+                    self.pool, self.fn, [q for q, _ in batch]
+                )
+            except Exception as e:
+                self.failed += len(batch)
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            finally:
+                self.batch_seconds += time.perf_counter() - t0
+
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+    def metrics(self) -> dict:
+        batches = sum(self.batch_sizes.values())
+        served = sum(size * n for size, n in self.batch_sizes.items())
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "abandoned": self.abandoned,
+            "batches": batches,
+            "mean_batch_size": round(served / batches, 2) if batches else 0.0,
+            "max_batch_size": max(self.batch_sizes, default=0),
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            "mean_batch_ms": round(1000 * self.batch_seconds / batches, 3) if batches else 0.0,
+        }
+
+
+def _response(status: HTTPStatus, body: dict, *, keep_alive: bool, headers: dict = None) -> bytes:
+    payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    lines = [
+        f"HTTP/1.1 {status.value} {status.phrase}",
+        "Content-Type: application/json; charset=utf-8",
+        f"Content-Length: {len(payload)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload
+
+
+async def _read_request(reader):
+    """Return (method, path, headers, body) or None on EOF."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY:
+        raise ValueError("request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+async def _handle(batcher: MicroBatcher, reader, writer):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                writer.write(_response(HTTPStatus.BAD_REQUEST, {"error": "malformed request"}, keep_alive=False))
+                break
+            if request is None:
+                break
+
+            method, path, headers, body = request
+            keep_alive = headers.get("connection", "").lower() != "close"
+
+            if method == "GET" and path == "/healthz":
+                status, reply, extra = HTTPStatus.OK, {"ok": True}, None
+            elif method == "GET" and path == "/metrics":
+                reply = batcher.metrics()
+                if tracing.is_enabled():
+                    reply["spans"] = tracing.summary()
+                status, extra = HTTPStatus.OK, None
+            elif method == "POST" and path == "/fal":
+                answer = await _fal(batcher, body, writer)
+                if answer is None:  # client went away; nobody to answer
+                    break
+                status, reply, extra = answer
+            else:
+                status, reply, extra = HTTPStatus.NOT_FOUND, {"error": f"no route {method} {path}"}, None
+
+            writer.write(_response(status, reply, keep_alive=keep_alive, headers=extra))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _client_gone(writer):
+    """
+    Return once the connection is lost (reset by the peer, or closed).
+    EOF on the read side does not count: the request has been read in
+    full, and a client may half-close (shutdown(SHUT_WR)) and still wait
+    for its reply.
+    """
+    try:
+        await writer.wait_closed()
+    except OSError:  # lost with an error, e.g. a reset
+        pass
+
+
+async def _fal(batcher: MicroBatcher, body: bytes, writer):
+    """(status, reply, headers), or None if the client disconnected while queued."""
+    try:
+        query = json.loads(body)["query"]
+        if not isinstance(query, str):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return HTTPStatus.BAD_REQUEST, {"error": 'expected {"query": "<text>"}'}, None
+
+    request = asyncio.ensure_future(batcher.submit(query))
+    gone = asyncio.ensure_future(_client_gone(writer))
+    await asyncio.wait({request, gone}, return_when=asyncio.FIRST_COMPLETED)
+    gone.cancel()
+    if not request.done():
+        # cancels the queued future too, so the collector skips it
+        request.cancel()
+        batcher.abandoned += 1
+        return None
+
+    try:
+        result = request.result()
+    except QueueFull:
+        return HTTPStatus.SERVICE_UNAVAILABLE, {"error": "server busy"}, {"Retry-After": "1"}
+    except Exception as e:
+        return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}, None
+    return HTTPStatus.OK, result, None
+
+
+async def serve(
+    service: FalService,
+    host: str = HOST,
+    port: int = PORT,
+    *,
+    window_ms: float = WINDOW_MS,
+    max_batch: int = MAX_BATCH,
+    max_queue: int = MAX_QUEUE,
+):
+    batcher = MicroBatcher(
+        service.fal_batch,
+        window_ms=window_ms,
+        max_batch=max_batch,
+        max_queue=max_queue,
+    )
+    batcher.start()
+    server = await asyncio.start_server(
+        lambda r, w: _handle(batcher, r, w), host=host, port=port
+    )
+    print(f"[SERVER] listening on http://{host}:{port} "
+          f"(window={window_ms}ms, max_batch={max_batch}, max_queue={max_queue})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+
+def main():
+    from scripts.cli import embed_query, get_query_cache
+
+    parser = argparse.ArgumentParser(description="YaarAI micro-batching HTTP server")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--window-ms", type=float, default=WINDOW_MS)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE)
+    parser.add_argument("--embedder", choices=sorted(EMBEDDERS), default=QUERY_EMBEDDER)
+    parser.add_argument("--trace", type=Path, nargs="?", const=tracing.TRACE_DIR / "server.jsonl",
+                        help="Record per-stage spans (JSONL); summaries appear in /metrics")
+    args = parser.parse_args()
+
+    if args.trace:
+        tracing.enable(args.trace)
+
+    cache = get_query_cache(args.embedder)
+    service = FalService(embed_query, embed_batch=cache.get_many)
+    print(f"[SERVER] loaded {len(service.retriever)} bayts")
+
+    try:
+        asyncio.run(serve(
+            service,
+            args.host,
+            args.port,
+            window_ms=args.window_ms,
+            max_batch=args.max_batch,
+            max_queue=args.max_queue,
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
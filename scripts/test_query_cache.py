@@ -0,0 +1,64 @@
+# scripts/test_query_cache.py
+# Query normalization / cache regression check
+#
+#   python -m scripts.test_query_cache          # exits 1 on any failure
+#
+# Spelling variants of one question must share a cache key and a vector
+# (whichever variant arrives first), and normalization must not rewrite
+# the noun «می» (wine) into a verb prefix.
+
+import sys
+
+import numpy as np
+
+from scripts.query_cache import QueryEmbeddingCache, normalize_query
+
+# (variants that must share one key, expected normalized form)
+SAME_KEY = [
+    (["می رسم", "می‌رسم", "میرسم", "می رسم؟"], "میرسم"),
+    (["نمی دانم", "نمی‌دانم", "نمي دانم!"], "نمیدانم"),
+    (["كي مي رسم به يار؟", "کی می‌رسم به یار"], "کی میرسم به یار"),
+]
+# must come out unchanged
+UNCHANGED = ["جام می و خون دل", "می ناب", "ساقی می بده"]
+
+
+def main():
+    failures = []
+
+    for variants, expected in SAME_KEY:
+        for v in variants:
+            got = normalize_query(v)
+            if got != expected:
+                failures.append(f"normalize_query({v!r}) = {got!r}, expected {expected!r}")
+    for text in UNCHANGED:
+        got = normalize_query(text)
+        if got != text:
+            failures.append(f"normalize_query({text!r}) = {got!r}, expected unchanged")
+
+    # the vector depends on the key only, not on which variant came first
+    embedded = []
+
+    def embed(text):
+        embedded.append(text)
+        return np.frombuffer(text.encode("utf-8").ljust(16, b"\0")[:16], dtype=np.float32)
+
+    for variants, expected in SAME_KEY:
+        first = QueryEmbeddingCache(embed, "check", path=None)
+        last = QueryEmbeddingCache(embed, "check", path=None)
+        a = first.get(variants[0])
+        b = last.get_many(variants[::-1])
+        if not all(np.array_equal(a, row) for row in b):
+            failures.append(f"{variants!r}: embedding depends on the variant seen first")
+    stray = sorted(set(embedded) - {expected for _, expected in SAME_KEY})
+    if stray:
+        failures.append(f"embed called with unnormalized text: {stray!r}")
+
+    for f in failures:
+        print(f"[QUERY CACHE] {f}")
+    print("[QUERY CACHE] OK" if not failures else "[QUERY CACHE] FAIL")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
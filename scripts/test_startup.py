@@ -0,0 +1,88 @@
+# scripts/test_startup.py
+# CLI startup regression check (python -X importtime)
+#
+#   python -m scripts.test_startup              # exits 1 when over budget
+#   python -m scripts.test_startup --budget-ms 80
+#
+# Imports scripts.cli in a fresh interpreter, reads the cumulative import
+# time from -X importtime, and checks that no heavy module was pulled in.
+# Short-lived CLI calls (and every call that a running daemon answers)
+# should never pay for NumPy, retrieval or the OpenAI client.
+
+import argparse
+import re
+import subprocess
+import sys
+
+ENTRY_MODULE = "scripts.cli"
+BUDGET_MS = 75.0
+RUNS = 5  # take the best of a few runs; the first one warms the page cache
+
+# must stay out of `import scripts.cli`
+HEAVY_MODULES = [
+    "numpy",
+    "openai",
+    "scripts.retrieval",
+    "scripts.embedders",
+    "scripts.query_cache",
+    "scripts.language.affect_variants",
+]
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(module: str = ENTRY_MODULE):
+    """
+    Import `module` in a fresh interpreter.
+    Returns (cumulative ms for `module`, set of all modules imported).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr}")
+
+    cumulative_us = None
+    imported = set()
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_LINE.match(line)
+        if not m:
+            continue
+        _, cum, _, name = m.groups()
+        imported.add(name)
+        if name == module:
+            cumulative_us = int(cum)
+
+    if cumulative_us is None:
+        raise RuntimeError(f"{module} missing from -X importtime output")
+    return cumulative_us / 1000.0, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI import-time budget check")
+    parser.add_argument("--module", default=ENTRY_MODULE)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=RUNS)
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.runs):
+        ms, imported = measure(args.module)
+        timings.append(ms)
+    best = min(timings)
+
+    heavy = [m for m in HEAVY_MODULES if m in imported]
+    ok = best <= args.budget_ms and not heavy
+
+    print(f"[STARTUP] import {args.module}: best {best:.1f} ms of {args.runs} "
+          f"(budget {args.budget_ms:.0f} ms)")
+    if heavy:
+        print(f"[STARTUP] heavy modules imported eagerly: {', '.join(heavy)}")
+    print("[STARTUP] OK" if ok else "[STARTUP] FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
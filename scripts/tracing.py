@@ -0,0 +1,208 @@
+# scripts/tracing.py
+# Lightweight per-stage timing for the fal request path
+#
+#   tracing.enable(trace_path=Path("data/traces/fal.jsonl"))
+#   with tracing.request("fal", profile=True):
+#       with tracing.span("embed_query"):
+#           ...
+#   print(tracing.summary())
+#
+# Disabled by default: span() then returns a shared no-op context manager
+# and @traced functions cost one flag check.
+# Spans use the monotonic perf_counter_ns clock. When enabled, each span is
+# written as one JSON line (if a trace path is set) and added to an
+# in-process histogram keyed by span name.
+
+import cProfile
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+
+TRACE_DIR = Path("data/traces")
+HISTOGRAM_SIZE = 10_000  # most recent durations kept per span name
+
+_enabled = False
+_trace_file = None
+_lock = threading.Lock()
+_histograms = defaultdict(lambda: deque(maxlen=HISTOGRAM_SIZE))
+_ids = itertools.count(1)
+
+_current_trace: ContextVar[Optional[str]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional[int]] = ContextVar("span", default=None)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "id", "parent", "start", "_tokens")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """Attach attributes (e.g. k, rows scored) to the span record."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.id = next(_ids)
+        self.parent = _current_span.get()
+        self._tokens = _current_span.set(self.id)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dur_ns = time.perf_counter_ns() - self.start
+        _current_span.reset(self._tokens)
+        _record(self, dur_ns, error=exc_type.__name__ if exc_type else None)
+        return False
+
+
+def _record(span: _Span, dur_ns: int, error: Optional[str]):
+    with _lock:
+        _histograms[span.name].append(dur_ns)
+        if _trace_file is not None:
+            rec = {
+                "trace": _current_trace.get(),
+                "span": span.name,
+                "id": span.id,
+                "parent": span.parent,
+                "start_ns": span.start,
+                "dur_ms": dur_ns / 1e6,
+                **span.attrs,
+            }
+            if error:
+                rec["error"] = error
+            _trace_file.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            _trace_file.flush()
+
+
+def enable(trace_path: Optional[Path] = None):
+    """Turn spans on; with `trace_path`, also append them as JSONL."""
+    global _enabled, _trace_file
+    with _lock:
+        if trace_path is not None and _trace_file is None:
+            trace_path.parent.mkdir(parents=True, exist_ok=True)
+            _trace_file = trace_path.open("a", encoding="utf-8")
+        _enabled = True
+
+
+def disable():
+    global _enabled, _trace_file
+    with _lock:
+        _enabled = False
+        if _trace_file is not None:
+            _trace_file.close()
+            _trace_file = None
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, **attrs):
+    """Time a block: `with span("retrieve", k=5): ...`."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name, attrs)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator form of `span`; the span is named after the function by default."""
+    def wrap(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(label, {}):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+class request:
+    """
+    Root span for one fal request. Sets a fresh trace id for nested spans
+    and, with `profile=True`, runs cProfile for just this request and
+    dumps the stats to TRACE_DIR/profile_<trace>.prof.
+    """
+
+    def __init__(self, name: str = "fal", *, profile: bool = False, **attrs):
+        self.name = name
+        self.profile = profile
+        self.attrs = attrs
+        self.trace_id = None
+        self.profile_path = None
+
+    def __enter__(self):
+        if not _enabled and not self.profile:
+            return self
+        self.trace_id = f"{os.getpid()}-{next(_ids)}"
+        self._trace_token = _current_trace.set(self.trace_id)
+        self._span = _Span(self.name, dict(self.attrs)) if _enabled else _NOOP
+        self._span.__enter__()
+        self._profiler = None
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace_id is None:
+            return False
+        if self._profiler is not None:
+            self._profiler.disable()
+            TRACE_DIR.mkdir(parents=True, exist_ok=True)
+            self.profile_path = TRACE_DIR / f"profile_{self.trace_id}.prof"
+            self._profiler.dump_stats(str(self.profile_path))
+            self._span.set(profile=str(self.profile_path))
+        self._span.__exit__(exc_type, exc, tb)
+        _current_trace.reset(self._trace_token)
+        return False
+
+
+def summary() -> dict:
+    """Per span name: count and p50/p95/p99/max in milliseconds."""
+    import numpy as np  # only needed for reporting; keeps CLI startup light
+
+    with _lock:
+        snap = {name: np.array(d, dtype=np.float64) / 1e6 for name, d in _histograms.items()}
+    out = {}
+    for name, ms in snap.items():
+        if ms.size == 0:
+            continue
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        out[name] = {
+            "count": int(ms.size),
+            "p50_ms": round(float(p50), 4),
+            "p95_ms": round(float(p95), 4),
+            "p99_ms": round(float(p99), 4),
+            "max_ms": round(float(ms.max()), 4),
+        }
+    return out
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
@@ -2,9 +2,13 @@
 from typing import List, Optional, TypedDict
 
 
-class BaytRow(TypedDict):
+class _BaytRowBase(TypedDict):
     poem_id: int
     bayt_id: int
     text: str                 # full bayt (couplet)
     affect: List[str]         # may be empty
     lens: Optional[str]       # None or lens label
+
+
+class BaytRow(_BaytRowBase, total=False):
+    ghazal_axis: str          # ghazal-level orientation, if annotated